@@ -1,17 +1,36 @@
 import os
 import uuid
+import socket
 import time
 import json
+import re
 import random
+import hashlib
+import gzip
+import mimetypes
+import bisect
+import collections
+import atexit
+import heapq
+import itertools
+import queue
+import io
+from urllib.parse import parse_qs
 from datetime import datetime
 import threading
+import asyncio
+import contextvars
+import sqlite3
 
-from flask import Flask, request, render_template_string, jsonify, Response, stream_with_context
+from flask import Flask, g, request, render_template, jsonify, url_for, Response, stream_with_context, send_file
 from flask_cors import CORS
 import cloudscraper
+import aiohttp
+import brotli
 import requests
+from requests.adapters import HTTPAdapter
 
-app = Flask(__name__)
+app = Flask(__name__, static_folder=None)
 
 # =========================
 # SECURITY: Only allow requests from your domain
@@ -22,28 +41,1034 @@ ALLOWED_ORIGINS = [
 
 CORS(app, origins=ALLOWED_ORIGINS, supports_credentials=True)
 
-# =========================
-# Global in-memory storage
-# =========================
-stats = {
-    "logs": [],
-    "ip_requests": {},
-    "jobs": {}
-}
-
 # ==============
 # Config
 # ==============
-NOTEGPT_BASE = "https://notegpt.io/api/v2/pdf-to-video"
+NOTEGPT_BASE = os.environ.get("NOTEGPT_BASE", "https://notegpt.io/api/v2/pdf-to-video")
+NOTEGPT_SETTINGS = {
+    "frame_size": "16:9",
+    "duration": 1,
+    "voice_key": "9e12f68d85f347808f76637a",
+    "no_watermark": True,
+    "lang": "en",
+    "gen_flow": "edit_script"
+}
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 8))
+JOB_QUEUE_SIZE = int(os.environ.get("JOB_QUEUE_SIZE", 64))
+POLL_WORKERS = int(os.environ.get("POLL_WORKERS", 8))
+# Transient upstream errors in a blocking stage are retried this many times.
+STAGE_RETRIES = int(os.environ.get("STAGE_RETRIES", 3))
+STAGE_RETRY_BASE = float(os.environ.get("STAGE_RETRY_BASE", 1.0))
+STAGE_RETRY_MAX = float(os.environ.get("STAGE_RETRY_MAX", 10.0))
+# Consecutive upstream failures that open the breaker, and how long it stays open.
+BREAKER_FAILURES = int(os.environ.get("BREAKER_FAILURES", 5))
+BREAKER_RESET_SECONDS = float(os.environ.get("BREAKER_RESET_SECONDS", 30))
+# "threaded" (cloudscraper on the worker pool) or "async" (aiohttp on one event loop)
+PIPELINE_MODE = os.environ.get("PIPELINE_MODE", "threaded")
+ASYNC_MAX_JOBS = int(os.environ.get("ASYNC_MAX_JOBS", 1000))
+ASYNC_HTTP_CONNECTIONS = int(os.environ.get("ASYNC_HTTP_CONNECTIONS", 100))
+ADMIN_LOG_PAGE_SIZE = 50
+LOG_BUFFER_SIZE = int(os.environ.get("LOG_BUFFER_SIZE", 10000))
+LOG_ARCHIVE_DIR = os.path.abspath(os.environ.get("LOG_ARCHIVE_DIR", "log-archive"))
+LOG_ARCHIVE_ROTATE_BYTES = int(os.environ.get("LOG_ARCHIVE_ROTATE_BYTES", 4 * 1024 * 1024))
+LOG_ARCHIVE_KEEP = int(os.environ.get("LOG_ARCHIVE_KEEP", 100))
+RATE_LIMIT_PER_DAY = int(os.environ.get("RATE_LIMIT_PER_DAY", 3))
+# Quota is RATE_LIMIT_PER_DAY videos per RATE_LIMIT_PERIOD seconds, refilled evenly.
+RATE_LIMIT_PERIOD = float(os.environ.get("RATE_LIMIT_PERIOD", 86400))
+RATE_LIMIT_SHARDS = int(os.environ.get("RATE_LIMIT_SHARDS", 16))
+# "sqlite" shares jobs, rate limits and logs between gunicorn workers.
+STATE_BACKEND = os.environ.get("STATE_BACKEND", "memory")
+STATE_DB_PATH = os.environ.get("STATE_DB_PATH", "snapstudy.sqlite3")
+JOB_STORE = os.environ.get("JOB_STORE", STATE_BACKEND)
+JOB_STORE_PATH = os.environ.get("JOB_STORE_PATH", STATE_DB_PATH)
+JOB_STORE_MAX = int(os.environ.get("JOB_STORE_MAX", 10000))
+JOB_TTL = int(os.environ.get("JOB_TTL", 6 * 3600))
+# Unfinished jobs in the SQLite store carry a lease their worker keeps
+# renewing; once it lapses another worker resumes the job.
+JOB_LEASE_SECONDS = int(os.environ.get("JOB_LEASE_SECONDS", 30))
+EVENTS_KEEPALIVE_SECONDS = 15
+# Each open /events stream holds a server thread for the whole render, so
+# keep this below the gunicorn --threads count; extra clients poll /status.
+EVENTS_MAX_STREAMS = int(os.environ.get("EVENTS_MAX_STREAMS", 4))
+VIDEO_CACHE_DIR = os.path.abspath(os.environ.get("VIDEO_CACHE_DIR", "video-cache"))
+VIDEO_CACHE_MAX_BYTES = int(os.environ.get("VIDEO_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+STREAM_CHUNK_MIN = int(os.environ.get("STREAM_CHUNK_MIN", 64 * 1024))
+STREAM_CHUNK_MAX = int(os.environ.get("STREAM_CHUNK_MAX", 1024 * 1024))
+SERVER_IP_TTL = int(os.environ.get("SERVER_IP_TTL", 3600))
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+CDN_POOL_HOSTS = int(os.environ.get("CDN_POOL_HOSTS", 8))
+CDN_POOL_PER_HOST = int(os.environ.get("CDN_POOL_PER_HOST", 32))
+RESULT_CACHE_MAX = int(os.environ.get("RESULT_CACHE_MAX", 5000))
+RESULT_CACHE_TTL = int(os.environ.get("RESULT_CACHE_TTL", 6 * 3600))
+
+
+# =========================
+# Job store
+# =========================
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+class MemoryJobStore:
+    """LRU-bounded job table; finished jobs expire ``ttl`` seconds after
+    they reach a terminal status."""
+
+    def __init__(self, max_jobs=JOB_STORE_MAX, ttl=JOB_TTL):
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self._jobs = collections.OrderedDict()
+        self._expires = {}
+        self._lock = threading.Lock()
+        self._next_sweep = time.time() + 60
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def _expired(self, job_id, now):
+        expires_at = self._expires.get(job_id)
+        return expires_at is not None and expires_at <= now
+
+    def _drop(self, job_id):
+        self._jobs.pop(job_id, None)
+        self._expires.pop(job_id, None)
+
+    def _sweep(self, now):
+        self._next_sweep = now + 60
+        for job_id in [j for j, exp in self._expires.items() if exp <= now]:
+            self._drop(job_id)
+
+    def create(self, job_id, job):
+        now = time.time()
+        with self._lock:
+            if now >= self._next_sweep:
+                self._sweep(now)
+            self._jobs[job_id] = dict(job)
+            self._jobs.move_to_end(job_id)
+            if job.get("status") in TERMINAL_STATUSES:
+                self._expires[job_id] = now + self.ttl
+            else:
+                self._expires.pop(job_id, None)
+            while len(self._jobs) > self.max_jobs:
+                oldest, _ = self._jobs.popitem(last=False)
+                self._expires.pop(oldest, None)
+            return dict(job)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if self._expired(job_id, time.time()):
+                self._drop(job_id)
+                return None
+            self._jobs.move_to_end(job_id)
+            return dict(job)
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job.update(fields)
+            if job.get("status") in TERMINAL_STATUSES:
+                self._expires[job_id] = time.time() + self.ttl
+            self._jobs.move_to_end(job_id)
+            return dict(job)
+
+    def delete(self, job_id):
+        with self._lock:
+            self._drop(job_id)
+
+    def lapsed(self, now):
+        """Ids of unfinished jobs whose lease has run out."""
+        with self._lock:
+            return [j for j, job in self._jobs.items() if lease_lapsed(job, now)]
+
+    def followers(self, leader_id):
+        """``(job_id, job)`` for the unfinished jobs attached to ``leader_id``."""
+        with self._lock:
+            return [
+                (j, dict(job)) for j, job in self._jobs.items()
+                if job.get("leader_id") == leader_id and job.get("status") not in TERMINAL_STATUSES
+            ]
+
+    def claim(self, job_id, lease, now):
+        """Take over an unfinished job whose lease lapsed; returns it or None."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or not lease_lapsed(job, now):
+                return None
+            job["lease"] = lease
+            return dict(job)
+
+    def renew(self, job_ids, lease):
+        """Extend ``lease`` on jobs it still holds; returns the ids it no
+        longer holds."""
+        lost = []
+        with self._lock:
+            for job_id in job_ids:
+                job = self._jobs.get(job_id)
+                if not holds_lease(job, lease):
+                    lost.append(job_id)
+                else:
+                    job["lease"] = lease
+        return lost
+
+
+class SQLiteBackend:
+    """Per-thread SQLite connections in WAL mode, safe to share between
+    processes on the same box."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        return _SQLiteTransaction(self._conn())
+
+
+class _SQLiteTransaction:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+class SQLiteJobStore(SQLiteBackend):
+    """Job table persisted in SQLite (WAL mode) so it survives restarts."""
+
+    def __init__(self, path=JOB_STORE_PATH, ttl=JOB_TTL):
+        super().__init__(path)
+        self.ttl = ttl
+        self._next_sweep = 0
+        with self._transaction() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY,"
+                " data TEXT NOT NULL,"
+                " status TEXT NOT NULL,"
+                " updated_at REAL NOT NULL,"
+                " expires_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_expires_at ON jobs (expires_at)")
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+
+    def _expires_at(self, job, now):
+        if job.get("status") in TERMINAL_STATUSES:
+            return now + self.ttl
+        return None
+
+    def _sweep(self, conn, now):
+        self._next_sweep = now + 60
+        conn.execute("DELETE FROM jobs WHERE expires_at <= ?", (now,))
+
+    def create(self, job_id, job):
+        now = time.time()
+        conn = self._conn()
+        if now >= self._next_sweep:
+            self._sweep(conn, now)
+        conn.execute(
+            "INSERT OR REPLACE INTO jobs (id, data, status, updated_at, expires_at)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (job_id, json.dumps(job), job.get("status", ""), now, self._expires_at(job, now)),
+        )
+        return dict(job)
+
+    def get(self, job_id):
+        row = self._conn().execute(
+            "SELECT data FROM jobs WHERE id = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (job_id, time.time()),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update(self, job_id, **fields):
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            job = json.loads(row[0])
+            job.update(fields)
+            conn.execute(
+                "UPDATE jobs SET data = ?, status = ?, updated_at = ?, expires_at = ? WHERE id = ?",
+                (json.dumps(job), job.get("status", ""), now, self._expires_at(job, now), job_id),
+            )
+        return job
+
+    def delete(self, job_id):
+        self._conn().execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def lapsed(self, now):
+        rows = self._conn().execute(
+            f"SELECT id FROM jobs WHERE status NOT IN ({', '.join('?' * len(TERMINAL_STATUSES))})"
+            " AND json_extract(data, '$.leader_id') IS NULL"
+            " AND COALESCE(json_extract(data, '$.lease.until'), 0) <= ?",
+            TERMINAL_STATUSES + (now,),
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def followers(self, leader_id):
+        rows = self._conn().execute(
+            f"SELECT id, data FROM jobs WHERE status NOT IN ({', '.join('?' * len(TERMINAL_STATUSES))})"
+            " AND json_extract(data, '$.leader_id') = ?",
+            TERMINAL_STATUSES + (leader_id,),
+        ).fetchall()
+        return [(row[0], json.loads(row[1])) for row in rows]
+
+    def claim(self, job_id, lease, now):
+        with self._transaction() as conn:
+            row = conn.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            job = json.loads(row[0]) if row else None
+            if job is None or not lease_lapsed(job, now):
+                return None
+            job["lease"] = lease
+            conn.execute("UPDATE jobs SET data = ?, updated_at = ? WHERE id = ?", (json.dumps(job), now, job_id))
+        return job
+
+    def renew(self, job_ids, lease):
+        lost = []
+        with self._transaction() as conn:
+            for job_id in job_ids:
+                row = conn.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                job = json.loads(row[0]) if row else None
+                if not holds_lease(job, lease):
+                    lost.append(job_id)
+                    continue
+                job["lease"] = lease
+                conn.execute("UPDATE jobs SET data = ? WHERE id = ?", (json.dumps(job), job_id))
+        return lost
+
+
+def lease_lapsed(job, now):
+    # Followers never run a pipeline; they are recovered with their leader.
+    if job.get("status") in TERMINAL_STATUSES or job.get("leader_id"):
+        return False
+    lease = job.get("lease")
+    return lease is None or lease["until"] <= now
+
+
+def holds_lease(job, lease):
+    return (
+        job is not None
+        and job.get("status") not in TERMINAL_STATUSES
+        and (job.get("lease") or {}).get("owner") == lease["owner"]
+    )
+
+
+def create_job_store():
+    if JOB_STORE == "sqlite":
+        return SQLiteJobStore()
+    return MemoryJobStore()
+
+
+jobs = create_job_store()
+
+
+# =========================
+# Rate limiting
+# =========================
+def gcra(tat, now, limit, period):
+    """Generic cell rate algorithm: allow ``limit`` requests per ``period``
+    as a burst, then one every ``period / limit`` seconds.
+
+    ``tat`` is the key's theoretical arrival time (None for a new key).
+    Returns the new tat if the request is allowed, else None. A key whose
+    tat is in the past has its full quota back and can be forgotten.
+    """
+    tat = max(tat or now, now) + period / limit
+    if tat - now > period:
+        return None
+    return tat
+
+
+class RateLimiter:
+    """Sharded in-memory GCRA limiter.
+
+    One float per active key. Keys are kept in update order so stale ones
+    (tat already passed) are dropped from the front as new hits arrive.
+    """
+
+    def __init__(self, limit, period, shards=RATE_LIMIT_SHARDS):
+        self.limit = limit
+        self.period = period
+        self._shards = [(threading.Lock(), collections.OrderedDict()) for _ in range(shards)]
+
+    def hit(self, key, now=None):
+        now = time.time() if now is None else now
+        lock, tats = self._shards[hash(key) % len(self._shards)]
+        with lock:
+            tat = gcra(tats.get(key), now, self.limit, self.period)
+            if tat is not None:
+                tats[key] = tat
+                tats.move_to_end(key)
+            # Two evictions per hit outpace the at most one key a hit adds.
+            for _ in range(2):
+                oldest = next(iter(tats), None)
+                if oldest is None or tats[oldest] > now:
+                    break
+                del tats[oldest]
+            return tat is not None
+
+    def exhausted(self, key, now=None):
+        """True if ``hit`` would refuse ``key``; spends nothing."""
+        now = time.time() if now is None else now
+        _, tats = self._shards[hash(key) % len(self._shards)]
+        return gcra(tats.get(key), now, self.limit, self.period) is None
+
+    def __len__(self):
+        return sum(len(tats) for _, tats in self._shards)
+
+
+# =========================
+# Shared state (rate limits, activity log)
+# =========================
+class LogArchive:
+    """JSON Lines archive of log entries that fell out of memory.
+
+    Entries arrive through a queue and are written by one background
+    thread, so callers never touch the disk. The active file rotates at
+    ``rotate_bytes`` into a gzip file named after the id range it holds,
+    which lets readers skip whole files by cursor without opening them.
+    """
+
+    NAME_RE = re.compile(r"^activity-(\d+)-(\d+)\.jsonl\.gz$")
+
+    def __init__(self, root, rotate_bytes, keep):
+        self.root = root
+        self.rotate_bytes = rotate_bytes
+        self.keep = keep
+        self.current_path = os.path.join(root, "current.jsonl")
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread = None
+        os.makedirs(root, exist_ok=True)
+
+    def _archives(self):
+        """``(first_id, last_id, path)`` for every rotated file, newest first."""
+        found = []
+        for name in os.listdir(self.root):
+            match = self.NAME_RE.match(name)
+            if match:
+                found.append((int(match.group(1)), int(match.group(2)), os.path.join(self.root, name)))
+        return sorted(found, reverse=True)
+
+    def _read_current(self):
+        try:
+            with open(self.current_path) as f:
+                return [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    def last_id(self):
+        with self._lock:
+            current = self._read_current()
+            if current:
+                return current[-1]["id"]
+            archives = self._archives()
+            return archives[0][1] if archives else 0
+
+    def put(self, entry):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="log-archive")
+                    self._thread.daemon = True
+                    self._thread.start()
+        self._queue.put(entry)
+
+    def close(self, entries):
+        """Write anything still queued, then ``entries``, synchronously.
+        Used at shutdown so ids stay in order on disk."""
+        with self._lock:
+            pending = []
+            while True:
+                try:
+                    pending.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._append(pending + entries)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with self._lock:
+                    self._append(batch)
+            except OSError:
+                pass
+
+    def _append(self, entries):
+        if not entries:
+            return
+        with open(self.current_path, "a") as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+        if os.path.getsize(self.current_path) >= self.rotate_bytes:
+            self._rotate()
+
+    def _rotate(self):
+        entries = self._read_current()
+        if not entries:
+            return
+        name = f"activity-{entries[0]['id']:012d}-{entries[-1]['id']:012d}.jsonl.gz"
+        with open(self.current_path, "rb") as src, gzip.open(os.path.join(self.root, name), "wb") as dst:
+            dst.write(src.read())
+        os.remove(self.current_path)
+        for _, _, path in self._archives()[self.keep:]:
+            os.remove(path)
+
+    def scan(self, before=None):
+        """Yield archived entries newest first, starting below ``before``.
+        Files are opened one at a time, only as the caller keeps reading."""
+        with self._lock:
+            current = self._read_current()
+            archives = self._archives()
+        for entry in reversed(current):
+            if before is None or entry["id"] < before:
+                yield entry
+        for first_id, _, path in archives:
+            if before is not None and first_id >= before:
+                continue
+            try:
+                with gzip.open(path, "rt") as f:
+                    entries = [json.loads(line) for line in f if line.strip()]
+            except FileNotFoundError:
+                continue
+            for entry in reversed(entries):
+                if before is None or entry["id"] < before:
+                    yield entry
+
+
+class MemoryState:
+    """Process-local state; only correct with a single gunicorn worker.
+
+    The activity log is a fixed-size ring buffer; entries it overwrites
+    are handed to a LogArchive and stay queryable from disk.
+    """
+
+    def __init__(self, log_capacity=LOG_BUFFER_SIZE, archive=None):
+        self._archive = archive or LogArchive(LOG_ARCHIVE_DIR, LOG_ARCHIVE_ROTATE_BYTES, LOG_ARCHIVE_KEEP)
+        self._capacity = log_capacity
+        self._ring = [None] * log_capacity
+        self._next_id = self._archive.last_id() + 1
+        self._first_id = self._next_id
+        self._log_index = {"status": {}, "ip": {}, "topic_key": {}}
+        self._limiter = RateLimiter(RATE_LIMIT_PER_DAY, RATE_LIMIT_PERIOD)
+        self._lock = threading.Lock()
+        atexit.register(self._flush_logs)
+
+    def hit_rate_limit(self, ip):
+        return self._limiter.hit(ip)
+
+    def rate_limit_exhausted(self, ip):
+        return self._limiter.exhausted(ip)
+
+    def ip_count(self):
+        return len(self._limiter)
+
+    def _oldest_id(self):
+        return max(self._first_id, self._next_id - self._capacity)
+
+    def append_log(self, entry):
+        with self._lock:
+            entry = dict(entry, id=self._next_id, topic_key=normalize_topic(entry["topic"]))
+            self._next_id += 1
+            slot = (entry["id"] - 1) % self._capacity
+            evicted = self._ring[slot]
+            if evicted:
+                for field, index in self._log_index.items():
+                    ids = index[evicted[field]]
+                    ids.popleft()
+                    if not ids:
+                        del index[evicted[field]]
+            self._ring[slot] = entry
+            for field, index in self._log_index.items():
+                index.setdefault(entry[field], collections.deque()).append(entry["id"])
+        if evicted:
+            self._archive.put(evicted)
+
+    def _flush_logs(self):
+        with self._lock:
+            entries = [self._ring[(i - 1) % self._capacity] for i in range(self._oldest_id(), self._next_id)]
+        self._archive.close(entries)
+
+    def log_count(self):
+        return self._next_id - 1
+
+    def query_logs(self, status=None, ip=None, topic=None, before=None, limit=50):
+        filters = log_filters(status, ip, topic)
+        with self._lock:
+            oldest_id = self._oldest_id()
+            # Walk the shortest matching index newest-first from the cursor.
+            if filters:
+                ids = min((self._log_index[f].get(v, ()) for f, v in filters.items()), key=len)
+            else:
+                ids = range(oldest_id, self._next_id)
+            end = bisect.bisect_left(ids, before) if before else len(ids)
+            rows = []
+            for i in range(end - 1, -1, -1):
+                entry = self._ring[(ids[i] - 1) % self._capacity]
+                if all(entry[f] == v for f, v in filters.items()):
+                    rows.append(public_log(entry))
+                    if len(rows) > limit:
+                        break
+        if len(rows) <= limit:
+            archive_before = min(before, oldest_id) if before else oldest_id
+            for entry in self._archive.scan(archive_before):
+                if all(entry.get(f) == v for f, v in filters.items()):
+                    rows.append(public_log(entry))
+                    if len(rows) > limit:
+                        break
+        return log_page(rows, limit)
+
+
+class SQLiteState(SQLiteBackend):
+    """Rate limits and activity log shared by every worker on the box."""
+
+    def __init__(self, path=STATE_DB_PATH):
+        super().__init__(path)
+        with self._transaction() as conn:
+            conn.execute("DROP TABLE IF EXISTS ip_requests")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limits ("
+                " ip TEXT PRIMARY KEY,"
+                " tat REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS rate_limits_tat ON rate_limits (tat)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS logs ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " timestamp TEXT NOT NULL,"
+                " ip TEXT NOT NULL,"
+                " topic TEXT NOT NULL,"
+                " status TEXT NOT NULL,"
+                " error TEXT NOT NULL,"
+                " topic_key TEXT NOT NULL DEFAULT '')"
+            )
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(logs)")]
+            if "topic_key" not in columns:
+                conn.execute("ALTER TABLE logs ADD COLUMN topic_key TEXT NOT NULL DEFAULT ''")
+            for field in ("status", "ip", "topic_key"):
+                conn.execute(f"CREATE INDEX IF NOT EXISTS logs_{field} ON logs ({field}, id)")
+
+    def hit_rate_limit(self, ip):
+        # gcra() as one UPSERT: a single autocommit statement is atomic on
+        # its own, so this skips the BEGIN IMMEDIATE/SELECT/COMMIT round
+        # trips. The WHERE leaves a refused hit's row untouched (rowcount 0).
+        now = time.time()
+        conn = self._conn()
+        allowed = conn.execute(
+            "INSERT INTO rate_limits (ip, tat) VALUES (:ip, :now + :inc)"
+            " ON CONFLICT (ip) DO UPDATE SET tat = MAX(tat, :now) + :inc"
+            " WHERE MAX(tat, :now) + :inc - :now <= :period",
+            {"ip": ip, "now": now, "inc": RATE_LIMIT_PERIOD / RATE_LIMIT_PER_DAY, "period": RATE_LIMIT_PERIOD},
+        ).rowcount == 1
+        # Lazy expiry: keys whose quota has fully refilled carry no state.
+        if random.random() < 0.01:
+            conn.execute("DELETE FROM rate_limits WHERE tat <= ?", (now,))
+        return allowed
+
+    def rate_limit_exhausted(self, ip):
+        now = time.time()
+        row = self._conn().execute("SELECT tat FROM rate_limits WHERE ip = ?", (ip,)).fetchone()
+        return row is not None and gcra(row[0], now, RATE_LIMIT_PER_DAY, RATE_LIMIT_PERIOD) is None
+
+    def ip_count(self):
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM rate_limits WHERE tat > ?", (time.time(),)
+        ).fetchone()[0]
+
+    def append_log(self, entry):
+        self._conn().execute(
+            "INSERT INTO logs (timestamp, ip, topic, status, error, topic_key) VALUES (?, ?, ?, ?, ?, ?)",
+            (entry["timestamp"], entry["ip"], entry["topic"], entry["status"], entry["error"],
+             normalize_topic(entry["topic"])),
+        )
+
+    def log_count(self):
+        # Ids are AUTOINCREMENT and never reused, so the newest id is the
+        # number of entries ever logged (as in MemoryState) without a scan.
+        return self._conn().execute("SELECT COALESCE(MAX(id), 0) FROM logs").fetchone()[0]
+
+    def query_logs(self, status=None, ip=None, topic=None, before=None, limit=50):
+        clauses = [f"{field} = ?" for field in log_filters(status, ip, topic)]
+        params = list(log_filters(status, ip, topic).values())
+        if before:
+            clauses.append("id < ?")
+            params.append(before)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._conn().execute(
+            f"SELECT id, timestamp, ip, topic, status, error FROM logs{where} ORDER BY id DESC LIMIT ?",
+            params + [limit + 1],
+        ).fetchall()
+        return log_page([
+            {"id": r[0], "timestamp": r[1], "ip": r[2], "topic": r[3], "status": r[4], "error": r[5]}
+            for r in rows
+        ], limit)
+
+
+def log_filters(status, ip, topic):
+    filters = {}
+    if status:
+        filters["status"] = status
+    if ip:
+        filters["ip"] = ip
+    if topic:
+        filters["topic_key"] = normalize_topic(topic)
+    return filters
+
+
+def public_log(entry):
+    return {k: entry[k] for k in ("id", "timestamp", "ip", "topic", "status", "error")}
+
+
+def log_page(rows, limit):
+    """Trim a newest-first result fetched with ``limit + 1`` rows and return
+    it with the cursor for the next (older) page, or None at the end."""
+    if len(rows) > limit:
+        return rows[:limit], rows[limit - 1]["id"]
+    return rows, None
+
+
+def create_state():
+    if STATE_BACKEND == "sqlite":
+        return SQLiteState()
+    return MemoryState()
+
+
+state = create_state()
+
+
+# =========================
+# Metrics
+# =========================
+class ThreadShards:
+    """Per-thread dicts that are merged only when scraped, so recording a
+    sample never takes a lock.
+
+    Servers that start a thread per request would leave one shard per
+    request behind, so shards of threads that have exited are folded into
+    a single retired shard (``fold(total, value)`` with ``total`` None for
+    a new key) whenever a thread registers or the metrics are read.
+    """
+
+    def __init__(self, fold):
+        self._fold = fold
+        self._local = threading.local()
+        self._shards = []
+        self._retired = {}
+        self._lock = threading.Lock()
+
+    def mine(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._retire_dead()
+                self._shards.append((threading.current_thread(), shard))
+            return shard
+
+    def _retire_dead(self):
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+                continue
+            # Values are replaced, never mutated, so snapshots stay consistent.
+            for key, value in shard.items():
+                self._retired[key] = self._fold(self._retired.get(key), value)
+        self._shards = live
+
+    def all(self):
+        with self._lock:
+            self._retire_dead()
+            return [dict(self._retired)] + [shard for _, shard in self._shards]
+
+
+def format_labels(label, value, **extra):
+    pairs = ([(label, value)] if label else []) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, label=None):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self._shards = ThreadShards(self._fold)
+        metrics_registry.append(self)
+
+    @staticmethod
+    def _fold(total, value):
+        return value if total is None else total + value
+
+    def inc(self, label_value="", amount=1):
+        shard = self._shards.mine()
+        shard[label_value] = shard.get(label_value, 0) + amount
+
+    def totals(self):
+        totals = {}
+        for shard in self._shards.all():
+            for key, value in list(shard.items()):
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} counter"
+        for key, value in sorted(self.totals().items()):
+            yield f"{self.name}{format_labels(self.label, key)} {value}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram; each label value's cell is a list of
+    per-bucket counts (last one is +Inf) followed by the running sum."""
+
+    def __init__(self, name, help_text, label, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._shards = ThreadShards(self._fold)
+        metrics_registry.append(self)
+
+    @staticmethod
+    def _fold(total, cell):
+        return list(cell) if total is None else [a + b for a, b in zip(total, cell)]
+
+    def observe(self, label_value, seconds):
+        shard = self._shards.mine()
+        cell = shard.get(label_value)
+        if cell is None:
+            cell = shard[label_value] = [0] * (len(self.buckets) + 1) + [0.0]
+        cell[bisect.bisect_left(self.buckets, seconds)] += 1
+        cell[-1] += seconds
+
+    def render(self):
+        merged = {}
+        for shard in self._shards.all():
+            for key, cell in list(shard.items()):
+                total = merged.setdefault(key, [0] * len(cell))
+                for i, value in enumerate(cell):
+                    total[i] += value
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} histogram"
+        for key, cell in sorted(merged.items()):
+            running = 0
+            for bound, count in zip(self.buckets + ("+Inf",), cell):
+                running += count
+                yield f"{self.name}_bucket{format_labels(self.label, key, le=bound)} {running}"
+            yield f"{self.name}_sum{format_labels(self.label, key)} {round(cell[-1], 6)}"
+            yield f"{self.name}_count{format_labels(self.label, key)} {running}"
+
+
+class Gauge:
+    """Read at scrape time from ``fn``."""
+
+    def __init__(self, name, help_text, fn):
+        self.name = name
+        self.help_text = help_text
+        self.fn = fn
+        metrics_registry.append(self)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} gauge"
+        yield f"{self.name} {self.fn()}"
+
+
+def render_metrics():
+    return "\n".join(line for metric in metrics_registry for line in metric.render()) + "\n"
+
+
+metrics_registry = []
+
+STAGE_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 180, 300)
+ROUTE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+stage_seconds = Histogram(
+    "snapstudy_stage_seconds", "Time spent in each pipeline stage.", "stage", STAGE_BUCKETS)
+stage_failures = Counter(
+    "snapstudy_stage_failures_total", "Jobs that failed in each pipeline stage.", "stage")
+route_seconds = Histogram(
+    "snapstudy_route_seconds", "Time to response headers per route.", "route", ROUTE_BUCKETS)
+stage_retries = Counter(
+    "snapstudy_stage_retries_total", "Stage retries after transient upstream errors.", "stage")
+jobs_started = Counter("snapstudy_jobs_started_total", "Pipelines started.")
+jobs_recovered = Counter(
+    "snapstudy_jobs_recovered_total", "Jobs taken over from a worker that stopped renewing its lease.")
+jobs_finished = Counter("snapstudy_jobs_finished_total", "Pipelines finished, by outcome.", "status")
+rate_limit_rejections = Counter(
+    "snapstudy_rate_limit_rejections_total", "Submissions refused for quota, by layer.", "layer")
+video_bytes = Counter(
+    "snapstudy_video_bytes_total", "Video bytes sent to clients, by source.", "source")
+Gauge(
+    "snapstudy_upstream_circuit_open", "1 while the upstream circuit breaker refuses submissions.",
+    lambda: int(upstream_breaker.state != "closed"),
+)
+Gauge("snapstudy_queue_depth", "Jobs waiting for a pipeline slot.", lambda: pipeline_runner.depth())
+Gauge(
+    "snapstudy_active_jobs", "Pipelines started and not yet finished.",
+    lambda: sum(jobs_started.totals().values()) - sum(jobs_finished.totals().values()),
+)
+
+
+def count_video_bytes(body, source):
+    for chunk in body:
+        video_bytes.inc(source, len(chunk))
+        yield chunk
+
+
+# =========================
+# Job traces
+# =========================
+PIPELINE_STAGES = ("notegpt_init", "wait_for_script", "fetch_script_data", "trigger_video_render", "poll_final_video")
+TRACE_MAX_UPSTREAM = 200
+
+# Recent stage durations in seconds, for the admin page percentiles.
+stage_samples = {stage: collections.deque(maxlen=1000) for stage in PIPELINE_STAGES}
+
+# The trace of the job an async pipeline task is running; read by the
+# aiohttp request hooks, which have no other way to find it.
+current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+def percentile(values, q):
+    """``q`` quantile of an already sorted list."""
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+class JobTrace:
+    """Compact timeline of one job, stored on it as ``trace``.
+
+    Times are seconds since the job started. ``upstream`` has one
+    ``[stage, method, path, status, ms]`` row per upstream response.
+    """
+
+    def __init__(self, started_at):
+        self.started_at = started_at
+        self.spans = []
+        self.polls = {}
+        self.retries = 0
+        self.upstream = []
+        self.dropped = 0
+
+    def _now(self):
+        return round(time.time() - self.started_at, 3)
+
+    def _stage(self):
+        return self.spans[-1]["stage"] if self.spans and self.spans[-1]["end"] is None else None
+
+    def open(self, stage):
+        self.spans.append({"stage": stage, "start": self._now(), "end": None})
+
+    def close(self, flag=None):
+        """End the open span; ``flag`` ("error", "interrupted") marks how."""
+        if self._stage() is not None:
+            span = self.spans[-1]
+            span["end"] = self._now()
+            if flag:
+                span[flag] = True
+
+    @classmethod
+    def restore(cls, started_at, data):
+        """Continue a trace saved by a worker that died mid-span."""
+        trace = cls(started_at)
+        if data:
+            trace.spans = data["spans"]
+            trace.polls = data["polls"]
+            trace.retries = data["retries"]
+            trace.upstream = data["upstream"]
+            trace.dropped = data["upstream_dropped"]
+            trace.close("interrupted")
+        return trace
+
+    def retry(self):
+        self.retries += 1
+
+    def response(self, method, url, status, seconds):
+        stage = self._stage()
+        path = url.split("?", 1)[0].replace(NOTEGPT_BASE, "") or "/"
+        if path == "/status":
+            self.polls[stage] = self.polls.get(stage, 0) + 1
+        if len(self.upstream) < TRACE_MAX_UPSTREAM:
+            self.upstream.append([stage, method, path, status, round(seconds * 1000, 1)])
+        else:
+            self.dropped += 1
+
+    def to_dict(self):
+        return {
+            "spans": [dict(span) for span in self.spans],
+            "polls": dict(self.polls),
+            "retries": self.retries,
+            "upstream": list(self.upstream),
+            "upstream_dropped": self.dropped,
+        }
+
+
+def upstream_trace_config():
+    """aiohttp hooks that time each request of the current job's trace."""
+    config = aiohttp.TraceConfig()
+    
+    async def on_start(session, ctx, params):
+        ctx.started = time.perf_counter()
+    
+    async def on_end(session, ctx, params):
+        trace = current_trace.get()
+        if trace is not None:
+            trace.response(params.method, str(params.url), params.response.status,
+                           time.perf_counter() - ctx.started)
+    
+    config.on_request_start.append(on_start)
+    config.on_request_end.append(on_end)
+    return config
+
+
+def stage_timings():
+    rows = []
+    for stage in PIPELINE_STAGES:
+        durations = sorted(stage_samples[stage])
+        if not durations:
+            rows.append({"stage": stage, "samples": 0, "p50": None, "p95": None, "p99": None})
+            continue
+        rows.append({
+            "stage": stage,
+            "samples": len(durations),
+            "p50": round(percentile(durations, 0.50), 2),
+            "p95": round(percentile(durations, 0.95), 2),
+            "p99": round(percentile(durations, 0.99), 2),
+        })
+    return rows
 
 
 # =========================
 # Security Middleware
 # =========================
-def validate_request_origin():
-    referer = request.headers.get('Referer', '')
-    origin = request.headers.get('Origin', '')
-    
+def origin_allowed(referer, origin):
     for allowed in ALLOWED_ORIGINS:
         if allowed in referer or allowed in origin:
             return True
@@ -51,30 +1076,118 @@ def validate_request_origin():
     return False
 
 
+def validate_request_origin():
+    return origin_allowed(request.headers.get('Referer', ''), request.headers.get('Origin', ''))
+
+
+class FrontFilter:
+    """WSGI middleware that turns away bad video submissions before Flask
+    routes them.
+
+    Only ``POST /`` is inspected. Foreign origins get the same 403 body as
+    the route; an IP with no quota left gets a pre-rendered rate-limit
+    page. The small form body is parsed here because cache hits and
+    attaches to a running render cost no quota and must still get
+    through; it is handed on to Flask unchanged. The quota is only peeked
+    at, so the route stays the one place that spends it.
+    """
+
+    MAX_BODY = 16 * 1024
+    FORBIDDEN = json.dumps({"error": "Unauthorized domain"}).encode()
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+        self._limited_page = None
+
+    def __call__(self, environ, start_response):
+        if environ.get("REQUEST_METHOD") != "POST" or environ.get("PATH_INFO") != "/":
+            return self.wsgi_app(environ, start_response)
+        if not origin_allowed(environ.get("HTTP_REFERER", ""), environ.get("HTTP_ORIGIN", "")):
+            return self._respond(start_response, "403 FORBIDDEN", "application/json", self.FORBIDDEN)
+        if not state.rate_limit_exhausted(real_ip(environ.get("HTTP_X_FORWARDED_FOR", ""), environ.get("REMOTE_ADDR"))):
+            return self.wsgi_app(environ, start_response)
+        topic = self._read_topic(environ)
+        if not topic:
+            return self.wsgi_app(environ, start_response)
+        key = topic_cache_key(topic)
+        if key in result_cache or inflight.running(key):
+            return self.wsgi_app(environ, start_response)
+        rate_limit_rejections.inc("front")
+        return self._respond(start_response, "200 OK", "text/html; charset=utf-8", self._rate_limited_page())
+
+    def _read_topic(self, environ):
+        """The submitted topic, or None if the body isn't a small form of
+        known length. Chunked bodies are left unread for Flask."""
+        if not environ.get("CONTENT_TYPE", "").startswith("application/x-www-form-urlencoded"):
+            return None
+        try:
+            length = int(environ.get("CONTENT_LENGTH") or -1)
+        except ValueError:
+            return None
+        if length < 0 or length > self.MAX_BODY:
+            return None
+        body = environ["wsgi.input"].read(length)
+        environ["wsgi.input"] = io.BytesIO(body)
+        return (parse_qs(body.decode("utf-8", "replace")).get("topic") or [""])[0].strip()
+
+    def _rate_limited_page(self):
+        if self._limited_page is None:
+            with app.app_context():
+                self._limited_page = render_template(
+                    INDEX_PAGE, topic="", job_id=None, rate_limited=True, busy=False,
+                    upstream_down=False, queue_depth=0, daily_limit=RATE_LIMIT_PER_DAY,
+                ).encode()
+        return self._limited_page
+
+    @staticmethod
+    def _respond(start_response, status, content_type, body):
+        start_response(status, [("Content-Type", content_type), ("Content-Length", str(len(body)))])
+        return [body]
+
+
 # =========================
 # Utility functions
 # =========================
-def get_real_ip(req):
-    xff = req.headers.get("X-Forwarded-For", "")
+def real_ip(xff, remote_addr):
     if xff:
         return xff.split(",")[0].strip()
-    return req.remote_addr or "unknown"
+    return remote_addr or "unknown"
+
+
+def get_real_ip(req):
+    return real_ip(req.headers.get("X-Forwarded-For", ""), req.remote_addr)
 
 
 def check_rate_limit(ip):
-    today = datetime.utcnow().date().isoformat()
-    rec = stats["ip_requests"].get(ip)
-    if not rec or rec.get("date") != today:
-        stats["ip_requests"][ip] = {"date": today, "count": 0}
-        rec = stats["ip_requests"][ip]
-    if rec["count"] >= 3:
-        return False
-    rec["count"] += 1
-    return True
+    return state.hit_rate_limit(ip)
+
+
+TOPIC_FILLER_PREFIXES = (
+    "explain", "describe", "tell me about", "what is", "what are",
+    "a video about", "video about", "make a video about", "teach me",
+)
+
+
+def normalize_topic(topic):
+    text = re.sub(r"[^\w\s]", " ", topic.lower())
+    text = " ".join(text.split())
+    stripped = True
+    while stripped:
+        stripped = False
+        for prefix in TOPIC_FILLER_PREFIXES:
+            if text.startswith(prefix + " "):
+                text = text[len(prefix) + 1:]
+                stripped = True
+    return text
+
+
+def topic_cache_key(topic):
+    settings = json.dumps(NOTEGPT_SETTINGS, sort_keys=True)
+    return hashlib.sha256(f"{normalize_topic(topic)}\n{settings}".encode()).hexdigest()
 
 
 def log_request(ip, topic, status, error_details=""):
-    stats["logs"].append({
+    state.append_log({
         "timestamp": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC"),
         "ip": ip,
         "topic": topic,
@@ -105,28 +1218,16 @@ def get_fresh_cookies():
     return {'anonymous_user_id': anon_id}
 
 
-def notegpt_init(scraper, topic):
-    headers = get_ghost_headers()
-    cookies = get_fresh_cookies()
-    
-    payload = {
+def init_payload(topic):
+    return {
         "source_url": "",
         "source_type": "text",
         "input_prompt": topic,
-        "setting": {
-            "frame_size": "16:9",
-            "duration": 1,
-            "voice_key": "9e12f68d85f347808f76637a",
-            "no_watermark": True,
-            "lang": "en",
-            "gen_flow": "edit_script"
-        }
+        "setting": dict(NOTEGPT_SETTINGS)
     }
-    
-    resp = scraper.post(NOTEGPT_BASE, headers=headers, cookies=cookies, json=payload, timeout=60)
-    resp.raise_for_status()
-    data = resp.json()
-    
+
+
+def parse_init_response(data):
     if not isinstance(data, dict):
         raise RuntimeError(f"Init API returned non-dict response: {data}")
     
@@ -137,45 +1238,15 @@ def notegpt_init(scraper, topic):
     if not cid:
         raise RuntimeError(f"conversation_id missing in init response: {data}")
     
-    return cid, headers, cookies
+    return cid
 
 
-def wait_for_script(scraper, cid, headers, cookies, timeout_sec=30):
-    start_time = time.time()
-    
-    while time.time() - start_time < timeout_sec:
-        try:
-            resp = scraper.get(
-                f"{NOTEGPT_BASE}/status",
-                params={"conversation_id": cid},
-                headers=headers,
-                cookies=cookies,
-                timeout=30
-            )
-            data = resp.json().get("data", {})
-            step = data.get("step")
-            
-            if step in ["edit_script", "pause"]:
-                return True
-            
-            time.sleep(3)
-        except Exception:
-            time.sleep(3)
-    
-    return True
+def parse_script_status(data):
+    step = data.get("data", {}).get("step")
+    return step in ["edit_script", "pause"], True
 
 
-def fetch_script_data(scraper, cid, headers, cookies):
-    resp = scraper.get(
-        f"{NOTEGPT_BASE}/script/get",
-        params={"conversation_id": cid},
-        headers=headers,
-        cookies=cookies,
-        timeout=60
-    )
-    resp.raise_for_status()
-    data = resp.json()
-    
+def parse_script_data(data):
     if not isinstance(data, dict):
         raise RuntimeError(f"Fetch script API returned non-dict response: {data}")
     
@@ -186,532 +1257,1742 @@ def fetch_script_data(scraper, cid, headers, cookies):
     return script_data
 
 
-def trigger_video_render(scraper, cid, script_data, headers, cookies):
+def render_payload(cid, script_data):
     for scene in script_data.get('scenes', []):
         scene_text = scene.get('scene_text', '')
         if " | By Chirag Rathi" not in scene_text:
             scene['scene_text'] = scene_text.rstrip() + " | By Chirag Rathi"
     
-    payload = {
+    return {
         "conversation_id": cid,
         "script_data": json.dumps(script_data),
         "is_force_save": True
     }
+
+
+def parse_final_status(data):
+    data = data.get("data", {})
+    status = data.get("status")
     
-    resp = scraper.post(
-        f"{NOTEGPT_BASE}/script/edit",
-        headers=headers,
-        cookies=cookies,
-        json=payload,
+    if status == "success":
+        video_url = data.get("cdn_video_url") or data.get("video_url")
+        if not video_url:
+            raise RuntimeError(f"Video status success but no URL found: {data}")
+        return True, video_url
+    
+    if status == "failed":
+        raise RuntimeError(f"Video rendering failed on server: {data}")
+    
+    return False, None
+
+
+def notegpt_init(scraper, topic):
+    headers = get_ghost_headers()
+    cookies = get_fresh_cookies()
+    
+    resp = scraper.post(NOTEGPT_BASE, headers=headers, cookies=cookies, json=init_payload(topic), timeout=60)
+    resp.raise_for_status()
+    return parse_init_response(resp.json()), headers, cookies
+
+
+def check_script_ready(scraper, cid, headers, cookies):
+    resp = scraper.get(
+        f"{NOTEGPT_BASE}/status",
+        params={"conversation_id": cid},
+        headers=headers,
+        cookies=cookies,
+        timeout=30
+    )
+    return parse_script_status(resp.json())
+
+
+def wait_for_script(scraper, cid, headers, cookies, on_ready, on_error, on_retry=None, guard=None, timeout_sec=30):
+    # Past the timeout we try to fetch the script anyway.
+    poller.poll(
+        lambda: check_script_ready(scraper, cid, headers, cookies),
+        script_poll_policy,
+        timeout_sec,
+        on_done=on_ready,
+        on_error=on_error,
+        on_timeout=lambda: on_ready(True),
+        retry_on=Exception,
+        on_retry=on_retry,
+        guard=guard,
+    )
+
+
+def fetch_script_data(scraper, cid, headers, cookies):
+    resp = scraper.get(
+        f"{NOTEGPT_BASE}/script/get",
+        params={"conversation_id": cid},
+        headers=headers,
+        cookies=cookies,
+        timeout=60
+    )
+    resp.raise_for_status()
+    return parse_script_data(resp.json())
+
+
+def trigger_video_render(scraper, cid, script_data, headers, cookies):
+    resp = scraper.post(
+        f"{NOTEGPT_BASE}/script/edit",
+        headers=headers,
+        cookies=cookies,
+        json=render_payload(cid, script_data),
         timeout=60
     )
     resp.raise_for_status()
     return resp.json()
 
 
-def poll_final_video(scraper, cid, headers, cookies, timeout_sec=300):
-    start_time = time.time()
+def check_final_video(scraper, cid, headers, cookies):
+    resp = scraper.get(
+        f"{NOTEGPT_BASE}/status",
+        params={"conversation_id": cid},
+        headers=headers,
+        cookies=cookies,
+        timeout=30
+    )
+    return parse_final_status(resp.json())
+
+
+def poll_final_video(scraper, cid, headers, cookies, on_video, on_error, on_retry=None, guard=None, timeout_sec=300):
+    def timed_out():
+        on_error(TimeoutError(f"Polling timed out after {timeout_sec}s"))
+    
+    poller.poll(
+        lambda: check_final_video(scraper, cid, headers, cookies),
+        render_poll_policy,
+        timeout_sec,
+        on_done=on_video,
+        on_error=on_error,
+        on_timeout=timed_out,
+        retry_on=requests.exceptions.RequestException,
+        on_retry=on_retry,
+        guard=guard,
+    )
+
+
+# =========================
+# Async pipeline (PIPELINE_MODE=async)
+# =========================
+async def notegpt_init_async(session, topic):
+    headers = get_ghost_headers()
+    cookies = get_fresh_cookies()
+    
+    async with session.post(NOTEGPT_BASE, headers=headers, cookies=cookies, json=init_payload(topic),
+                            timeout=aiohttp.ClientTimeout(total=60)) as resp:
+        resp.raise_for_status()
+        return parse_init_response(await resp.json(content_type=None)), headers, cookies
+
+
+async def get_status_async(session, cid, headers, cookies):
+    async with session.get(f"{NOTEGPT_BASE}/status", params={"conversation_id": cid}, headers=headers,
+                           cookies=cookies, timeout=aiohttp.ClientTimeout(total=30)) as resp:
+        return await resp.json(content_type=None)
+
+
+async def poll_async(check, policy, timeout_sec, retry_on, on_retry=None, guard=None):
+    started = time.monotonic()
+    attempt = 0
+    while True:
+        attempt += 1
+        if guard is not None:
+            guard()
+        try:
+            done, value = await check()
+        except retry_on:
+            done, value = False, None
+            if on_retry:
+                on_retry()
+        else:
+            upstream_breaker.record_success()
+        elapsed = time.monotonic() - started
+        if done:
+            policy.record(elapsed)
+            return value
+        if elapsed >= timeout_sec:
+            raise TimeoutError(f"Polling timed out after {timeout_sec}s")
+        await asyncio.sleep(min(policy.next_delay(elapsed, attempt), timeout_sec - elapsed))
+
+
+async def wait_for_script_async(session, cid, headers, cookies, on_retry=None, guard=None, timeout_sec=30):
+    async def check():
+        return parse_script_status(await get_status_async(session, cid, headers, cookies))
     
-    while time.time() - start_time < timeout_sec:
+    try:
+        await poll_async(check, script_poll_policy, timeout_sec, Exception, on_retry, guard)
+    except TimeoutError:
+        pass
+    return True
+
+
+async def fetch_script_data_async(session, cid, headers, cookies):
+    async with session.get(f"{NOTEGPT_BASE}/script/get", params={"conversation_id": cid}, headers=headers,
+                           cookies=cookies, timeout=aiohttp.ClientTimeout(total=60)) as resp:
+        resp.raise_for_status()
+        return parse_script_data(await resp.json(content_type=None))
+
+
+async def trigger_video_render_async(session, cid, script_data, headers, cookies):
+    async with session.post(f"{NOTEGPT_BASE}/script/edit", headers=headers, cookies=cookies,
+                            json=render_payload(cid, script_data),
+                            timeout=aiohttp.ClientTimeout(total=60)) as resp:
+        resp.raise_for_status()
+        return await resp.json(content_type=None)
+
+
+async def poll_final_video_async(session, cid, headers, cookies, on_retry=None, guard=None, timeout_sec=300):
+    async def check():
+        return parse_final_status(await get_status_async(session, cid, headers, cookies))
+    
+    # Same as the threaded pipeline's RequestException: network errors, a
+    # slow /status call and an unparseable body are all worth another poll.
+    retry_on = (aiohttp.ClientError, asyncio.TimeoutError, ValueError)
+    return await poll_async(check, render_poll_policy, timeout_sec, retry_on, on_retry, guard)
+
+
+class AsyncPipelineRunner:
+    """Runs jobs as coroutines on one event loop in a dedicated thread, so
+    thousands of mostly-waiting jobs share a single OS thread.
+
+    Uses aiohttp with the same ghost headers and cookies as the threaded
+    pipeline; unlike cloudscraper it cannot answer Cloudflare challenges.
+    """
+
+    def __init__(self, max_jobs, max_queue):
+        self.max_jobs = max_jobs
+        self.max_queue = max_queue
+        self.active = 0
+        self.pending = 0
+        self._lock = threading.Lock()
+        self._loop = None
+        self._session = None
+        self._semaphore = None
+
+    def _start(self):
+        self._loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=self._loop.run_forever, name="async-pipeline")
+        thread.daemon = True
+        thread.start()
+
+    def is_full(self):
+        with self._lock:
+            return self.pending >= self.max_jobs + self.max_queue
+
+    def depth(self):
+        with self._lock:
+            return max(self.pending - self.max_jobs, 0)
+
+    def position(self, job_id):
+        return 0
+
+    def submit(self, job_id, topic, user_ip, recovered=None):
+        with self._lock:
+            if self.pending >= self.max_jobs + self.max_queue:
+                raise JobQueueFull(f"Async pipeline is full ({self.pending} jobs)")
+            if self._loop is None:
+                self._start()
+            self.pending += 1
+        asyncio.run_coroutine_threadsafe(self._run(job_id, topic, user_ip, recovered), self._loop)
+
+    async def _run(self, job_id, topic, user_ip, recovered):
         try:
-            resp = scraper.get(
-                f"{NOTEGPT_BASE}/status",
-                params={"conversation_id": cid},
-                headers=headers,
-                cookies=cookies,
-                timeout=30
-            )
-            data = resp.json().get("data", {})
-            status = data.get("status")
+            if self._session is None:
+                self._semaphore = asyncio.Semaphore(self.max_jobs)
+                self._session = aiohttp.ClientSession(
+                    connector=aiohttp.TCPConnector(limit=ASYNC_HTTP_CONNECTIONS),
+                    # Each job carries its own anonymous cookie; never share them.
+                    cookie_jar=aiohttp.DummyCookieJar(),
+                    trace_configs=[upstream_trace_config()],
+                )
+            async with self._semaphore:
+                self.active += 1
+                try:
+                    await AsyncVideoPipeline(job_id, topic, user_ip, self._session).run(recovered)
+                finally:
+                    self.active -= 1
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+
+# =========================
+# Upstream retries and circuit breaker
+# =========================
+RETRYABLE_STAGES = ("notegpt_init", "fetch_script_data", "trigger_video_render")
+
+
+class UpstreamUnavailable(Exception):
+    pass
+
+
+def is_transient(e):
+    """Network trouble, timeouts, 429 and 5xx: worth another try."""
+    if isinstance(e, requests.exceptions.HTTPError):
+        status = e.response.status_code if e.response is not None else None
+    elif isinstance(e, aiohttp.ClientResponseError):
+        status = e.status
+    else:
+        return isinstance(e, (
+            requests.exceptions.ConnectionError,
+            requests.exceptions.Timeout,
+            aiohttp.ClientError,
+            asyncio.TimeoutError,
+        ))
+    return status is None or status == 429 or status >= 500
+
+
+def stage_backoff(attempt):
+    return min(STAGE_RETRY_BASE * 2 ** (attempt - 1), STAGE_RETRY_MAX) * random.uniform(0.8, 1.2)
+
+
+class CircuitBreaker:
+    """Stops admitting jobs while the upstream keeps failing.
+
+    ``threshold`` consecutive failures open it; any upstream call that
+    succeeds (a finished step or an answered status check) resets the
+    count. After ``reset_seconds`` one submission is let through as a probe
+    (half-open); the next success closes the breaker, a failure opens it
+    again.
+    """
+
+    def __init__(self, threshold, reset_seconds):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened = 0
+        self.retry_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if time.time() < self.retry_at:
+                return False
+            self.state = "half_open"
+            self.retry_at = time.time() + self.reset_seconds
+            return True
+
+    def is_open(self):
+        return self.state == "open" and time.time() < self.retry_at
+
+    def refusing(self):
+        """True if ``allow`` would refuse right now; unlike it, this never
+        takes the half-open probe."""
+        return self.state != "closed" and time.time() < self.retry_at
+
+    def retry_after(self):
+        return max(0, int(self.retry_at - time.time()) + 1)
+
+    def record_success(self):
+        if self.state == "closed" and not self.failures:
+            return
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.threshold):
+                self.state = "open"
+                self.opened += 1
+                self.retry_at = time.time() + self.reset_seconds
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "opened": self.opened,
+                "retry_in": self.retry_after() if self.state != "closed" else 0,
+            }
+
+
+upstream_breaker = CircuitBreaker(BREAKER_FAILURES, BREAKER_RESET_SECONDS)
+
+
+def process_video_generation(job_id, topic, user_ip):
+    VideoPipeline(job_id, topic, user_ip).start()
+
+
+class VideoPipeline:
+    """One job's trip through the upstream API.
+
+    Blocking steps run on the job scheduler's workers. Waiting for the
+    script and for the render is handed to the poll scheduler, so a job
+    that is only waiting holds no thread.
+    """
+
+    def __init__(self, job_id, topic, user_ip):
+        self.job_id = job_id
+        self.topic = topic
+        self.user_ip = user_ip
+        self.started_at = None
+        self.scraper = None
+        self.cid = None
+        self.headers = None
+        self.cookies = None
+        self.stage = None
+        self.stage_started = None
+        self.attempts = 0
+        self.script_data = None
+        self.trace = None
+
+    def start(self):
+        self._begin()
+        if self._upstream_down():
+            return
+        self._step(self._init)
+
+    def recover(self, job):
+        """Resume a job whose worker died, from its last checkpoint."""
+        self._step(self._recover, job)
+
+    def _recover(self, job):
+        stage = self._restore(job)
+        if stage is None:
+            self.start()
+            return
+        if self._upstream_down():
+            return
+        self._connect()
+        if stage == "wait_for_script":
+            self._step(self._wait_script)
+        elif stage == "poll_final_video":
+            self._step(self._poll_render)
+        else:
+            self._step(self._fetch)
+
+    def _begin(self):
+        self.started_at = time.time()
+        self.trace = JobTrace(self.started_at)
+        jobs_started.inc()
+        fields = {"status": "processing", "progress": "Initializing...", "started_at": self.started_at}
+        job = update_job(self.job_id, **fields)
+        if job is None:
+            job = jobs.create(self.job_id, dict(new_job(self.topic, self.user_ip), lease=leases.lease(self.job_id)))
+            update_job(self.job_id, **fields)
+        update_job(self.job_id, queue_seconds=round(self.started_at - job["queued_at"], 3))
+
+    def _restore(self, job):
+        """Load ``job``'s checkpoint. Returns the stage to resume at, or
+        None if it never got a conversation and has to start over."""
+        checkpoint = job.get("checkpoint") or {}
+        if not checkpoint.get("cid"):
+            return None
+        self.cid = checkpoint["cid"]
+        self.headers = checkpoint["headers"]
+        self.cookies = checkpoint["cookies"]
+        self.started_at = job.get("started_at") or time.time()
+        self.trace = JobTrace.restore(self.started_at, job.get("trace"))
+        jobs_started.inc()
+        update_job(self.job_id, status="processing", progress="Resuming after a restart...")
+        # The script itself isn't checkpointed; fetching it again is one GET.
+        if checkpoint["stage"] == "trigger_video_render":
+            return "fetch_script_data"
+        return checkpoint["stage"]
+
+    def _checkpoint(self, stage):
+        return {"stage": stage, "cid": self.cid, "headers": self.headers, "cookies": self.cookies}
+
+    def _upstream_down(self):
+        """Fail a job that was queued before the breaker opened."""
+        if not upstream_breaker.is_open():
+            return False
+        self._fail(UpstreamUnavailable("Video service is unavailable, please try again shortly"))
+        return True
+
+    def _check_lease(self):
+        if not leases.holds(self.job_id):
+            raise LeaseLost(f"Job {self.job_id} was taken over by another worker")
+
+    def _step(self, fn, *args):
+        """Run ``fn``; a transient upstream error retries the same step
+        later from the poll scheduler, without holding a worker."""
+        try:
+            self._check_lease()
+            fn(*args)
+        except Exception as e:
+            delay = self._retry_delay(e)
+            if delay is None:
+                self._fail(e)
+            else:
+                poller.call_later(delay, scheduler.resume, self.job_id, self._step, fn, *args)
+
+    def _retry_delay(self, e):
+        """Backoff before retrying the current stage after ``e``, or None
+        if the job should fail."""
+        if not is_transient(e):
+            return None
+        upstream_breaker.record_failure()
+        if self.stage not in RETRYABLE_STAGES or self.attempts >= STAGE_RETRIES:
+            return None
+        self.attempts += 1
+        self.trace.retry()
+        stage_retries.inc(self.stage)
+        update_job(self.job_id, progress=f"Upstream error, retrying ({self.attempts}/{STAGE_RETRIES})...")
+        return stage_backoff(self.attempts)
+
+    def _poll_retry(self):
+        self.trace.retry()
+        upstream_breaker.record_failure()
+
+    def _enter(self, stage, progress):
+        if stage == self.stage:
+            return
+        self._leave()
+        self.attempts = 0
+        self.trace.open(stage)
+        update_job(self.job_id, progress=progress, trace=self.trace.to_dict(), checkpoint=self._checkpoint(stage))
+        self.stage = stage
+        self.stage_started = time.perf_counter()
+
+    def _leave(self):
+        if self.stage is not None:
+            elapsed = time.perf_counter() - self.stage_started
+            stage_seconds.observe(self.stage, elapsed)
+            stage_samples[self.stage].append(elapsed)
+            self.trace.close()
+            self.stage = None
+            upstream_breaker.record_success()
+
+    def _on_response(self, resp, *args, **kwargs):
+        self.trace.response(resp.request.method, resp.url, resp.status_code, resp.elapsed.total_seconds())
+
+    def _connect(self):
+        self.scraper = create_scraper()
+        self.scraper.hooks["response"].append(self._on_response)
+
+    def _disconnect(self):
+        # Close the pooled connections now rather than whenever the GC
+        # breaks the scraper <-> pipeline cycle the response hook creates.
+        if self.scraper is not None:
+            self.scraper.close()
+            self.scraper = None
+
+    def _init(self):
+        self._connect()
+        
+        self._enter("notegpt_init", "Getting conversation ID...")
+        self.cid, self.headers, self.cookies = notegpt_init(self.scraper, self.topic)
+        self._wait_script()
+
+    def _wait_script(self):
+        self._enter("wait_for_script", "Waiting for script generation...")
+        wait_for_script(
+            self.scraper, self.cid, self.headers, self.cookies,
+            on_ready=self._script_ready,
+            on_error=self._fail,
+            on_retry=self._poll_retry,
+            guard=self._check_lease,
+        )
+
+    def _script_ready(self, _):
+        self._leave()
+        scheduler.resume(self.job_id, self._step, self._fetch)
+
+    def _fetch(self):
+        self._enter("fetch_script_data", "Fetching script data...")
+        self.script_data = fetch_script_data(self.scraper, self.cid, self.headers, self.cookies)
+        self._step(self._render)
+
+    def _render(self):
+        self._enter("trigger_video_render", "Triggering video render...")
+        trigger_video_render(self.scraper, self.cid, self.script_data, self.headers, self.cookies)
+        self._poll_render()
+
+    def _poll_render(self):
+        self._enter("poll_final_video", "Rendering video (this may take 2-3 minutes)...")
+        poll_final_video(
+            self.scraper, self.cid, self.headers, self.cookies,
+            on_video=lambda url: self._step(self._complete, url),
+            on_error=self._fail,
+            on_retry=self._poll_retry,
+            guard=self._check_lease,
+        )
+
+    def _complete(self, original_video_url):
+        self._leave()
+        jobs_finished.inc("completed")
+        finish_job(
+            self.job_id,
+            self.started_at,
+            status="completed",
+            original_url=original_video_url,
+            video_url=f"/video/{self.job_id}",
+            progress="Done!",
+            trace=self.trace.to_dict(),
+        )
+        result_cache.put(topic_cache_key(self.topic), original_video_url)
+        log_request(self.user_ip, self.topic, "success", "")
+        inflight.release(self.job_id, "success", "")
+        self._disconnect()
+
+    def _fail(self, e):
+        if isinstance(e, LeaseLost):
+            self._hand_over()
+            return
+        if self.stage is not None:
+            stage_failures.inc(self.stage)
+            self.stage = None
+        jobs_finished.inc("failed")
+        error_msg = f"{type(e).__name__}: {str(e)}"
+        fields = {}
+        if self.trace is not None:
+            self.trace.close("error")
+            fields["trace"] = self.trace.to_dict()
+        finish_job(self.job_id, self.started_at, status="failed", error=error_msg, progress="Failed", **fields)
+        log_request(self.user_ip, self.topic, "fail", error_msg)
+        inflight.release(self.job_id, "fail", error_msg)
+        self._disconnect()
+
+    def _hand_over(self):
+        """Stop local work on a job another worker has claimed. That worker
+        now writes every update, so the job itself is left alone."""
+        if self.trace is not None:
+            self.trace.close("interrupted")
+        self.stage = None
+        jobs_finished.inc("handed_over")
+        inflight.forget(self.job_id)
+        self._disconnect()
+
+
+class AsyncVideoPipeline(VideoPipeline):
+    def __init__(self, job_id, topic, user_ip, session):
+        super().__init__(job_id, topic, user_ip)
+        self.session = session
+
+    async def _blocking(self, fn, *args):
+        """Run a step that writes the job store or the log off the event
+        loop; with SQLite those can wait on the database lock."""
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    async def _attempt(self, stage, progress, fn, *args):
+        await self._blocking(self._enter, stage, progress)
+        while True:
+            self._check_lease()
+            try:
+                return await fn(*args)
+            except Exception as e:
+                delay = await self._blocking(self._retry_delay, e)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+
+    async def run(self, recovered=None):
+        stage = await self._blocking(self._restore, recovered) if recovered else None
+        if stage is None:
+            await self._blocking(self._begin)
+            stage = "notegpt_init"
+        if await self._blocking(self._upstream_down):
+            return
+        current_trace.set(self.trace)
+        remaining = PIPELINE_STAGES[PIPELINE_STAGES.index(stage):]
+        try:
+            if "notegpt_init" in remaining:
+                self.cid, self.headers, self.cookies = await self._attempt(
+                    "notegpt_init", "Getting conversation ID...",
+                    notegpt_init_async, self.session, self.topic,
+                )
             
-            if status == "success":
-                video_url = data.get("cdn_video_url") or data.get("video_url")
-                if not video_url:
-                    raise RuntimeError(f"Video status success but no URL found: {data}")
-                return video_url
+            if "wait_for_script" in remaining:
+                await self._blocking(self._enter, "wait_for_script", "Waiting for script generation...")
+                await wait_for_script_async(self.session, self.cid, self.headers, self.cookies, self._poll_retry,
+                                            self._check_lease)
             
-            if status == "failed":
-                raise RuntimeError(f"Video rendering failed on server: {data}")
+            if "fetch_script_data" in remaining:
+                self.script_data = await self._attempt(
+                    "fetch_script_data", "Fetching script data...",
+                    fetch_script_data_async, self.session, self.cid, self.headers, self.cookies,
+                )
+                
+                await self._attempt(
+                    "trigger_video_render", "Triggering video render...",
+                    trigger_video_render_async, self.session, self.cid, self.script_data, self.headers, self.cookies,
+                )
             
-            time.sleep(5)
-        except requests.exceptions.RequestException:
-            time.sleep(5)
-    
-    raise TimeoutError(f"Polling timed out after {timeout_sec}s")
+            await self._blocking(self._enter, "poll_final_video", "Rendering video (this may take 2-3 minutes)...")
+            original_video_url = await poll_final_video_async(
+                self.session, self.cid, self.headers, self.cookies, self._poll_retry, self._check_lease
+            )
+            self._check_lease()
+        except Exception as e:
+            await self._blocking(self._fail, e)
+            return
+        await self._blocking(self._complete, original_video_url)
 
 
-def process_video_generation(job_id, topic, user_ip):
-    stats["jobs"][job_id] = {
-        "status": "processing",
+def update_job(job_id, **fields):
+    job = jobs.update(job_id, **fields)
+    progress_hub.publish(job_id)
+    inflight.propagate(job_id, fields)
+    return job
+
+
+def finish_job(job_id, started_at, **fields):
+    leases.release(job_id)
+    finished_at = time.time()
+    return update_job(
+        job_id,
+        finished_at=finished_at,
+        run_seconds=round(finished_at - started_at, 3),
+        **fields
+    )
+
+
+def new_job(topic, user_ip=None):
+    return {
+        "status": "queued",
+        "user_ip": user_ip,
         "video_url": None,
         "original_url": None,
         "error": None,
         "topic": topic,
-        "progress": "Initializing..."
+        "progress": "Queued...",
+        "queued_at": time.time(),
+        "started_at": None,
+        "finished_at": None,
+        "queue_seconds": None,
+        "run_seconds": None,
     }
-    
-    try:
-        scraper = create_scraper()
-        
-        stats["jobs"][job_id]["progress"] = "Getting conversation ID..."
-        cid, headers, cookies = notegpt_init(scraper, topic)
-        
-        stats["jobs"][job_id]["progress"] = "Waiting for script generation..."
-        wait_for_script(scraper, cid, headers, cookies)
-        
-        stats["jobs"][job_id]["progress"] = "Fetching script data..."
-        script_data = fetch_script_data(scraper, cid, headers, cookies)
-        
-        stats["jobs"][job_id]["progress"] = "Triggering video render..."
-        trigger_video_render(scraper, cid, script_data, headers, cookies)
-        
-        stats["jobs"][job_id]["progress"] = "Rendering video (this may take 2-3 minutes)..."
-        original_video_url = poll_final_video(scraper, cid, headers, cookies)
-        
-        stats["jobs"][job_id]["status"] = "completed"
-        stats["jobs"][job_id]["original_url"] = original_video_url
-        stats["jobs"][job_id]["video_url"] = f"/video/{job_id}"
-        stats["jobs"][job_id]["progress"] = "Done!"
-        log_request(user_ip, topic, "success", "")
+
+
+# =========================
+# Job scheduler
+# =========================
+class JobQueueFull(Exception):
+    pass
+
+
+class JobScheduler:
+    """Fixed pool of worker threads fed by a bounded FIFO queue.
+
+    Thread count never exceeds ``workers`` regardless of load; once
+    ``max_queue`` jobs are waiting, ``submit`` raises ``JobQueueFull``.
+    """
+
+    def __init__(self, workers, max_queue):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.active = 0
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._threads = []
+
+    def _start(self):
+        # Started lazily so each forked gunicorn worker gets its own pool.
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"job-worker-{i}")
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def is_full(self):
+        with self._cond:
+            return len(self._queue) >= self.max_queue
+
+    def depth(self):
+        with self._cond:
+            return len(self._queue)
+
+    def position(self, job_id):
+        with self._cond:
+            for i, (queued_id, _, _) in enumerate(self._queue):
+                if queued_id == job_id:
+                    return i + 1
+        return 0
+
+    def submit(self, job_id, fn, *args):
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                raise JobQueueFull(f"Job queue is full ({self.max_queue} waiting)")
+            if not self._threads:
+                self._start()
+            self._queue.append((job_id, fn, args))
+            self._cond.notify()
+            return len(self._queue)
+
+    def resume(self, job_id, fn, *args):
+        """Queue the next step of an already-admitted job ahead of new
+        submissions; never refused."""
+        with self._cond:
+            if not self._threads:
+                self._start()
+            self._queue.appendleft((job_id, fn, args))
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                _, fn, args = self._queue.popleft()
+                self.active += 1
+            try:
+                fn(*args)
+            except Exception:
+                pass
+            finally:
+                with self._cond:
+                    self.active -= 1
+
+
+scheduler = JobScheduler(JOB_WORKERS, JOB_QUEUE_SIZE)
+
+
+# =========================
+# Poll scheduler
+# =========================
+class PollPolicy:
+    """Chooses the delay before the next status check.
+
+    With no history this is plain exponential backoff from ``first`` up to
+    ``maximum``. Once enough waits have completed, it skips ahead to just
+    before the fastest 10% usually finish, polls every ``first`` seconds
+    while most jobs finish (p10-p90), then backs off again for stragglers.
+    """
+
+    def __init__(self, first, maximum, history=200):
+        self.first = first
+        self.maximum = maximum
+        self._durations = collections.deque(maxlen=history)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._durations.append(seconds)
+
+    def percentile(self, q):
+        with self._lock:
+            durations = sorted(self._durations)
+        if len(durations) < 5:
+            return None
+        return percentile(durations, q)
+
+    def next_delay(self, elapsed, attempt):
+        p10 = self.percentile(0.10)
+        p90 = self.percentile(0.90)
+        if p10 is not None and elapsed < p10 * 0.8:
+            delay = p10 * 0.8 - elapsed
+        elif p90 is not None and elapsed < p90:
+            delay = self.first
+        else:
+            delay = min(self.first * 2 ** (attempt - 1), self.maximum)
+        return delay * random.uniform(0.8, 1.2)
+
+
+class PollScheduler:
+    """One heap-ordered timer thread owning every pending status check.
+
+    Due callbacks run on a small fixed pool, so hundreds of waiting jobs
+    cost one timer thread plus ``workers`` check threads.
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+        self.checks = 0
+        self._timers = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._ready = queue.Queue()
+        self._started = False
+
+    def _start(self):
+        self._started = True
+        timer = threading.Thread(target=self._run_timers, name="poll-timer")
+        timer.daemon = True
+        timer.start()
+        for i in range(self.workers):
+            worker = threading.Thread(target=self._run_ready, name=f"poll-worker-{i}")
+            worker.daemon = True
+            worker.start()
+
+    def pending(self):
+        with self._cond:
+            return len(self._timers)
+
+    def call_later(self, delay, fn, *args):
+        with self._cond:
+            if not self._started:
+                self._start()
+            heapq.heappush(self._timers, (time.monotonic() + delay, next(self._seq), fn, args))
+            self._cond.notify()
+
+    def poll(self, check, policy, timeout_sec, on_done, on_error, on_timeout, retry_on=Exception, on_retry=None,
+             guard=None):
+        """Call ``check`` until it returns ``(True, value)``, then
+        ``on_done(value)``. Exceptions matching ``retry_on`` count as "not
+        yet" (and call ``on_retry``); others go to ``on_error``. ``guard``
+        runs before every check; an exception from it ends the poll
+        through ``on_error``."""
+        PollTask(self, check, policy, timeout_sec, on_done, on_error, on_timeout, retry_on, on_retry, guard).run()
+
+    def _run_timers(self):
+        while True:
+            with self._cond:
+                while not self._timers or self._timers[0][0] > time.monotonic():
+                    self._cond.wait(self._timers[0][0] - time.monotonic() if self._timers else None)
+                _, _, fn, args = heapq.heappop(self._timers)
+            self._ready.put((fn, args))
+
+    def _run_ready(self):
+        while True:
+            fn, args = self._ready.get()
+            try:
+                fn(*args)
+            except Exception:
+                pass
+
+
+class PollTask:
+    def __init__(self, poller, check, policy, timeout_sec, on_done, on_error, on_timeout, retry_on, on_retry, guard):
+        self.poller = poller
+        self.check = check
+        self.policy = policy
+        self.timeout_sec = timeout_sec
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_timeout = on_timeout
+        self.retry_on = retry_on
+        self.on_retry = on_retry
+        self.guard = guard
+        self.started = time.monotonic()
+        self.attempts = 0
+
+    def run(self):
+        if self.guard is not None:
+            try:
+                self.guard()
+            except Exception as e:
+                self.on_error(e)
+                return
+        self.poller.checks += 1
+        self.attempts += 1
+        try:
+            done, value = self.check()
+        except self.retry_on:
+            done, value = False, None
+            if self.on_retry:
+                self.on_retry()
+        except Exception as e:
+            self.on_error(e)
+            return
+        else:
+            upstream_breaker.record_success()
         
-    except Exception as e:
-        error_msg = f"{type(e).__name__}: {str(e)}"
-        stats["jobs"][job_id]["status"] = "failed"
-        stats["jobs"][job_id]["error"] = error_msg
-        stats["jobs"][job_id]["progress"] = "Failed"
-        log_request(user_ip, topic, "fail", error_msg)
+        elapsed = time.monotonic() - self.started
+        if done:
+            self.policy.record(elapsed)
+            self.on_done(value)
+            return
+        if elapsed >= self.timeout_sec:
+            self.on_timeout()
+            return
+        delay = min(self.policy.next_delay(elapsed, self.attempts), self.timeout_sec - elapsed)
+        self.poller.call_later(delay, self.run)
+
+
+poller = PollScheduler(POLL_WORKERS)
+async_pipeline = AsyncPipelineRunner(ASYNC_MAX_JOBS, JOB_QUEUE_SIZE)
+pipeline_runner = async_pipeline if PIPELINE_MODE == "async" else scheduler
+script_poll_policy = PollPolicy(first=1, maximum=5)
+render_poll_policy = PollPolicy(first=2, maximum=15)
 
 
 # =========================
-# HTML Templates
+# Job recovery
 # =========================
-TEMPLATE = """
-<!doctype html>
-<html lang="en">
-<head>
-  <meta charset="utf-8">
-  <title>SnapStudy AI — Video Synthesis Studio</title>
-  <meta name="viewport" content="width=device-width, initial-scale=1">
-  <link rel="preconnect" href="https://fonts.googleapis.com">
-  <link rel="preconnect" href="https://fonts.gstatic.com" crossorigin>
-  <link href="https://fonts.googleapis.com/css2?family=Crimson+Pro:wght@400;600;700&family=IBM+Plex+Mono:wght@400;500;600&family=Manrope:wght@400;500;600;700;800&display=swap" rel="stylesheet">
-  
-  <style>
-    :root {
-      --ink: #0a0a0a;
-      --paper: #fdfcf9;
-      --amber: #f59e0b;
-      --rust: #dc2626;
-      --forest: #065f46;
-      --slate: #475569;
-      --cream: #fef3c7;
-    }
-    
-    * {
-      margin: 0;
-      padding: 0;
-      box-sizing: border-box;
-    }
-    
-    body {
-      font-family: 'Manrope', sans-serif;
-      background: var(--paper);
-      color: var(--ink);
-      line-height: 1.6;
-      overflow-x: hidden;
-    }
-    
-    body::before {
-      content: '';
-      position: fixed;
-      top: 0;
-      left: 0;
-      width: 100%;
-      height: 100%;
-      background-image: 
-        repeating-linear-gradient(0deg, transparent, transparent 2px, rgba(0,0,0,.02) 2px, rgba(0,0,0,.02) 4px),
-        repeating-linear-gradient(90deg, transparent, transparent 2px, rgba(0,0,0,.02) 2px, rgba(0,0,0,.02) 4px);
-      pointer-events: none;
-      z-index: 9999;
-      opacity: 0.4;
-    }
-    
-    .container {
-      max-width: 1400px;
-      margin: 0 auto;
-      padding: 3rem 2rem;
-    }
-    
-    .masthead {
-      text-align: center;
-      padding: 4rem 0 6rem;
-      border-bottom: 3px solid var(--ink);
-      margin-bottom: 4rem;
-      position: relative;
-    }
-    
-    .masthead::after {
-      content: '';
-      position: absolute;
-      bottom: -6px;
-      left: 0;
-      right: 0;
-      height: 3px;
-      background: var(--amber);
-    }
-    
-    .masthead h1 {
-      font-size: clamp(2.5rem, 8vw, 5rem);
-      font-weight: 800;
-      letter-spacing: -0.03em;
-      line-height: 0.95;
-      margin-bottom: 1rem;
-    }
-    
-    .masthead .tagline {
-      font-family: 'Crimson Pro', serif;
-      font-size: clamp(1.1rem, 3vw, 1.5rem);
-      color: var(--slate);
-      font-style: italic;
-      max-width: 600px;
-      margin: 0 auto;
-    }
-    
-    .studio-grid {
-      display: grid;
-      grid-template-columns: 1fr 1.2fr;
-      gap: 4rem;
-      align-items: start;
-    }
-    
-    @media (max-width: 968px) {
-      .studio-grid {
-        grid-template-columns: 1fr;
-        gap: 3rem;
-      }
-    }
-    
-    .section-label {
-      font-family: 'IBM Plex Mono', monospace;
-      font-size: 0.75rem;
-      font-weight: 600;
-      text-transform: uppercase;
-      letter-spacing: 0.15em;
-      color: var(--slate);
-      margin-bottom: 1.5rem;
-      display: flex;
-      align-items: center;
-      gap: 0.75rem;
-    }
-    
-    .section-label::before {
-      content: '';
-      width: 32px;
-      height: 2px;
-      background: var(--amber);
-    }
-    
-    .prompt-box {
-      margin-bottom: 2rem;
-    }
-    
-    .prompt-box label {
-      display: block;
-      font-weight: 600;
-      margin-bottom: 0.75rem;
-      color: var(--ink);
-    }
-    
-    .prompt-box textarea {
-      width: 100%;
-      min-height: 180px;
-      padding: 1.25rem;
-      border: 2px solid var(--ink);
-      background: var(--paper);
-      font-family: 'Crimson Pro', serif;
-      font-size: 1.125rem;
-      line-height: 1.7;
-      resize: vertical;
-      transition: all 0.2s;
-    }
-    
-    .prompt-box textarea:focus {
-      outline: none;
-      border-color: var(--amber);
-      box-shadow: 0 0 0 4px rgba(245, 158, 11, 0.1);
-    }
-    
-    .prompt-box textarea::placeholder {
-      color: var(--slate);
-      opacity: 0.5;
-    }
-    
-    .btn-generate {
-      width: 100%;
-      padding: 1.5rem 2rem;
-      background: var(--ink);
-      color: var(--paper);
-      border: none;
-      font-family: 'Manrope', sans-serif;
-      font-weight: 700;
-      font-size: 1rem;
-      text-transform: uppercase;
-      letter-spacing: 0.1em;
-      cursor: pointer;
-      transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1);
-      position: relative;
-      overflow: hidden;
-    }
-    
-    .btn-generate::before {
-      content: '';
-      position: absolute;
-      top: 0;
-      left: -100%;
-      width: 100%;
-      height: 100%;
-      background: var(--amber);
-      transition: left 0.4s cubic-bezier(0.4, 0, 0.2, 1);
-    }
-    
-    .btn-generate span {
-      position: relative;
-      z-index: 1;
-    }
-    
-    .btn-generate:hover::before {
-      left: 0;
-    }
-    
-    .btn-generate:hover {
-      transform: translateY(-2px);
-      box-shadow: 0 8px 24px rgba(10, 10, 10, 0.3);
-    }
-    
-    .btn-generate:active {
-      transform: translateY(0);
-    }
-    
-    .btn-generate:disabled {
-      opacity: 0.4;
-      cursor: not-allowed;
-      transform: none;
-    }
-    
-    .btn-generate:disabled::before {
-      display: none;
-    }
-    
-    .alert {
-      padding: 1.25rem;
-      border-left: 4px solid var(--rust);
-      background: rgba(220, 38, 38, 0.05);
-      margin-bottom: 1.5rem;
-    }
-    
-    .alert-text {
-      font-weight: 600;
-      color: var(--rust);
-      font-size: 0.95rem;
-    }
-    
-    .meta-info {
-      margin-top: 1.5rem;
-      padding-top: 1.5rem;
-      border-top: 1px solid rgba(10, 10, 10, 0.1);
-    }
-    
-    .meta-item {
-      font-family: 'IBM Plex Mono', monospace;
-      font-size: 0.8rem;
-      color: var(--slate);
-      margin-bottom: 0.5rem;
-    }
-    
-    .canvas {
-      position: sticky;
-      top: 2rem;
-      border: 3px solid var(--ink);
-      background: #fff;
-      padding: 2rem;
-      min-height: 500px;
-      display: flex;
-      flex-direction: column;
-      justify-content: center;
-      align-items: center;
-      text-align: center;
-    }
-    
-    .empty-state {
-      max-width: 400px;
-    }
-    
-    .empty-state-icon {
-      width: 120px;
-      height: 120px;
-      margin: 0 auto 2rem;
-      background: var(--cream);
-      border-radius: 50%;
-      display: flex;
-      align-items: center;
-      justify-content: center;
-      border: 2px solid var(--amber);
-    }
-    
-    .empty-state-icon svg {
-      width: 60px;
-      height: 60px;
-      stroke: var(--amber);
-      stroke-width: 1.5;
-    }
-    
-    .empty-state h3 {
-      font-family: 'Crimson Pro', serif;
-      font-size: 1.75rem;
-      margin-bottom: 0.75rem;
-      font-weight: 700;
-    }
-    
-    .empty-state p {
-      color: var(--slate);
-      line-height: 1.6;
-    }
-    
-    .processing-state {
-      width: 100%;
-    }
-    
-    .spinner {
-      width: 80px;
-      height: 80px;
-      margin: 0 auto 2rem;
-      border: 3px solid var(--cream);
-      border-top-color: var(--amber);
-      border-radius: 50%;
-      animation: spin 1s linear infinite;
-    }
-    
-    @keyframes spin {
-      to { transform: rotate(360deg); }
-    }
-    
-    .progress-text {
-      font-family: 'IBM Plex Mono', monospace;
-      font-size: 0.9rem;
-      color: var(--slate);
-      margin-top: 1rem;
-    }
-    
-    .job-id {
-      margin-top: 2rem;
-      padding-top: 2rem;
-      border-top: 1px solid rgba(10, 10, 10, 0.1);
-      font-family: 'IBM Plex Mono', monospace;
-      font-size: 0.75rem;
-      color: var(--slate);
-    }
-    
-    .video-complete {
-      width: 100%;
-      animation: fadeSlideIn 0.6s ease-out;
-    }
-    
-    @keyframes fadeSlideIn {
-      from {
-        opacity: 0;
-        transform: translateY(20px);
-      }
-      to {
-        opacity: 1;
-        transform: translateY(0);
-      }
-    }
-    
-    .video-complete video {
-      width: 100%;
-      border: 2px solid var(--ink);
-      margin-bottom: 1.5rem;
-    }
-    
-    .video-actions {
-      display: flex;
-      gap: 1rem;
-      margin-top: 1.5rem;
-    }
-    
-    .btn-download {
-      flex: 1;
-      padding: 1rem 1.5rem;
-      background: var(--forest);
-      color: white;
-      text-decoration: none;
-      font-weight: 600;
-      text-align: center;
-      transition: all 0.2s;
-      border: 2px solid var(--forest);
-      display: inline-block;
-    }
-    
-    .btn-download:hover {
-      background: white;
-      color: var(--forest);
-    }
-    
-    .credit {
-      margin-top: 1rem;
-      padding: 0.75rem;
-      background: var(--cream);
-      font-family: 'IBM Plex Mono', monospace;
-      font-size: 0.8rem;
-      border-left: 3px solid var(--amber);
-    }
-    
-    .error-state {
-      max-width: 500px;
-    }
-    
-    .error-icon {
-      width: 80px;
-      height: 80px;
-      margin: 0 auto 1.5rem;
-      background: rgba(220, 38, 38, 0.1);
-      border-radius: 50%;
-      display: flex;
-      align-items: center;
-      justify-content: center;
-    }
-    
-    .error-icon svg {
-      width: 40px;
-      height: 40px;
-      stroke: var(--rust);
-    }
-    
-    .error-details {
-      margin-top: 1.5rem;
-      padding: 1rem;
-      background: rgba(10, 10, 10, 0.03);
-      border: 1px solid rgba(10, 10, 10, 0.1);
-      font-family: 'IBM Plex Mono', monospace;
-      font-size: 0.75rem;
-      color: var(--slate);
-      text-align: left;
-      max-height: 200px;
-      overflow-y: auto;
-    }
-    
-    .colophon {
-      margin-top: 6rem;
-      padding-top: 2rem;
-      border-top: 1px solid rgba(10, 10, 10, 0.1);
-      text-align: center;
-      font-family: 'IBM Plex Mono', monospace;
-      font-size: 0.75rem;
-      color: var(--slate);
+class LeaseLost(Exception):
+    pass
+
+
+class JobLeases:
+    """Leases on the unfinished jobs this worker runs (SQLite store only).
+
+    Each job carries ``lease = {"owner", "until"}``, renewed by a heartbeat
+    on its own thread. A lease that lapses means its worker died; the same
+    heartbeat in any live worker then claims the job and resumes it from
+    its checkpoint. A pipeline checks ``holds`` before every step, so a
+    worker that stalled long enough to lose a lease stops running the job.
+    """
+
+    def __init__(self, ttl, enabled):
+        self.ttl = ttl
+        self.enabled = enabled
+        self.owner = None
+        self._held = set()
+        self._lock = threading.Lock()
+
+    def start(self):
+        # Called in each gunicorn worker after fork, so the owner is per process.
+        self.owner = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        atexit.register(self._abandon)
+        # Not on the poll scheduler: a backlog of slow status checks there
+        # could delay renewal past the lease.
+        thread = threading.Thread(target=self._run, name="job-leases")
+        thread.daemon = True
+        thread.start()
+
+    def _lease(self, until):
+        return {"owner": self.owner, "until": until}
+
+    def lease(self, job_id):
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._held.add(job_id)
+        return self._lease(time.time() + self.ttl)
+
+    def release(self, job_id):
+        with self._lock:
+            self._held.discard(job_id)
+
+    def holds(self, job_id):
+        """False once a heartbeat found the job claimed by another worker."""
+        if not self.enabled:
+            return True
+        with self._lock:
+            return job_id in self._held
+
+    def _run(self):
+        while True:
+            try:
+                self._heartbeat()
+            except Exception:
+                pass
+            time.sleep(self.ttl / 3)
+
+    def _heartbeat(self):
+        with self._lock:
+            held = list(self._held)
+        for job_id in jobs.renew(held, self._lease(time.time() + self.ttl)):
+            self.release(job_id)
+        self._recover()
+
+    def _recover(self):
+        now = time.time()
+        for job_id in jobs.lapsed(now):
+            job = jobs.claim(job_id, self._lease(now + self.ttl), now)
+            if job is None:
+                continue
+            with self._lock:
+                self._held.add(job_id)
+            jobs_recovered.inc()
+            # Followers ride on the recovered job again instead of each
+            # starting a pipeline of their own.
+            inflight.adopt(topic_cache_key(job["topic"]), job_id, jobs.followers(job_id))
+            try:
+                if PIPELINE_MODE == "async":
+                    async_pipeline.submit(job_id, job["topic"], job.get("user_ip"), job)
+                else:
+                    scheduler.resume(job_id, VideoPipeline(job_id, job["topic"], job.get("user_ip")).recover, job)
+            except JobQueueFull:
+                # Let the lease lapse so a less busy worker takes it.
+                inflight.forget(job_id)
+                self.release(job_id)
+
+    def _abandon(self):
+        """On a clean shutdown, hand our jobs over at once rather than
+        after the lease runs out."""
+        with self._lock:
+            held = list(self._held)
+        if held:
+            jobs.renew(held, self._lease(0))
+
+
+leases = JobLeases(JOB_LEASE_SECONDS, enabled=JOB_STORE == "sqlite")
+
+
+# =========================
+# Progress events
+# =========================
+class ProgressHub:
+    """Wakes /events streams when their job changes.
+
+    A job only has a condition variable while somebody is listening, so
+    publishing to a job nobody watches is a dict lookup.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._channels = {}
+
+    def publish(self, job_id):
+        with self._lock:
+            channel = self._channels.get(job_id)
+            if channel:
+                channel["version"] += 1
+                channel["cond"].notify_all()
+
+    def subscribe(self, job_id):
+        return ProgressSubscription(self, job_id)
+
+
+class ProgressSubscription:
+    def __init__(self, hub, job_id):
+        self.hub = hub
+        self.job_id = job_id
+        self.seen = 0
+
+    def __enter__(self):
+        with self.hub._lock:
+            channel = self.hub._channels.get(self.job_id)
+            if channel is None:
+                channel = {"cond": threading.Condition(self.hub._lock), "version": 0, "listeners": 0}
+                self.hub._channels[self.job_id] = channel
+            channel["listeners"] += 1
+            self.seen = channel["version"]
+            self._channel = channel
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        with self.hub._lock:
+            self._channel["listeners"] -= 1
+            if not self._channel["listeners"]:
+                self.hub._channels.pop(self.job_id, None)
+        return False
+
+    def wait(self, timeout):
+        """Block until the job is published or ``timeout`` elapses;
+        returns True if something changed."""
+        with self.hub._lock:
+            changed = self._channel["cond"].wait_for(
+                lambda: self._channel["version"] != self.seen, timeout
+            )
+            self.seen = self._channel["version"]
+            return changed
+
+
+progress_hub = ProgressHub()
+event_streams = threading.BoundedSemaphore(EVENTS_MAX_STREAMS)
+
+
+# =========================
+# Result cache
+# =========================
+class ResultCache:
+    """Finished video URLs keyed by ``topic_cache_key``, so a repeat topic
+    skips the multi-minute render. TTL-bounded because CDN links age."""
+
+    def __init__(self, max_entries=RESULT_CACHE_MAX, ttl=RESULT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.time():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def __contains__(self, key):
+        """Unexpired entry check that leaves LRU order and stats alone."""
+        entry = self._entries.get(key)
+        return entry is not None and entry[1] > time.time()
+
+    def put(self, key, original_url):
+        with self._lock:
+            self._entries[key] = (original_url, time.time() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(100.0 * self.hits / lookups, 1) if lookups else 0.0,
+                "entries": len(self._entries),
+            }
+
+
+result_cache = ResultCache()
+
+
+# =========================
+# In-flight deduplication
+# =========================
+class InflightRegistry:
+    """Lets a submission attach to a running job for the same topic key.
+
+    Followers are ordinary jobs that never run a pipeline; every update to
+    the leader is copied onto them. Attaching and propagating share one
+    lock so a follower can't miss an update made while it was being
+    created. Followers hold no lease of their own; whichever worker
+    recovers their leader adopts them as well.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._leaders = {}
+        self._keys = {}
+        self._followers = {}
+
+    def attach(self, key, job_id, job, user_ip):
+        """Create ``job`` as a follower of the job running ``key``; returns
+        False if nothing is running it."""
+        with self._lock:
+            return self._follow(key, job_id, job, user_ip)
+
+    def running(self, key):
+        return key in self._leaders
+
+    def lead(self, key, job_id, job, user_ip):
+        """Register ``job_id`` as the job running ``key``; returns False
+        (and attaches instead) if another submission got there first."""
+        with self._lock:
+            if self._follow(key, job_id, job, user_ip):
+                return False
+            self._leaders[key] = job_id
+            self._keys[job_id] = key
+            self._followers[job_id] = []
+            return True
+
+    def _follow(self, key, job_id, job, user_ip):
+        leader_id = self._leaders.get(key)
+        if leader_id is None:
+            return False
+        leader = jobs.get(leader_id) or {}
+        for field in ("status", "progress", "error", "original_url", "started_at", "finished_at"):
+            if field in leader:
+                job[field] = leader[field]
+        if leader.get("original_url"):
+            job["video_url"] = f"/video/{job_id}"
+        job["leader_id"] = leader_id
+        job["user_ip"] = user_ip
+        jobs.create(job_id, job)
+        self._followers[leader_id].append((job_id, user_ip, job["topic"]))
+        return True
+
+    def propagate(self, job_id, fields):
+        if job_id not in self._followers:
+            return
+        with self._lock:
+            for follower_id, _, _ in self._followers.get(job_id, ()):
+                if "video_url" in fields:
+                    fields = dict(fields, video_url=f"/video/{follower_id}")
+                jobs.update(follower_id, **fields)
+                progress_hub.publish(follower_id)
+
+    def adopt(self, key, job_id, followers):
+        """Register a job recovered from a dead worker as running ``key``,
+        together with the ``(job_id, job)`` followers it had there."""
+        with self._lock:
+            self._leaders.setdefault(key, job_id)
+            self._keys[job_id] = key
+            self._followers[job_id] = [
+                (follower_id, job.get("user_ip"), job["topic"]) for follower_id, job in followers
+            ]
+
+    def release(self, job_id, status, error_details):
+        followers = self.forget(job_id)
+        for _, user_ip, topic in followers:
+            log_request(user_ip, topic, status, error_details)
+        return followers
+
+    def forget(self, job_id):
+        """Drop ``job_id`` and its followers without finishing them."""
+        with self._lock:
+            key = self._keys.pop(job_id, None)
+            if key is not None and self._leaders.get(key) == job_id:
+                del self._leaders[key]
+            return self._followers.pop(job_id, [])
+
+
+inflight = InflightRegistry()
+
+
+# =========================
+# Server identity
+# =========================
+def lookup_public_ip():
+    return requests.get("https://api.ipify.org", timeout=10).text.strip()
+
+
+def local_interface_ip():
+    # Connecting a UDP socket sends nothing; it only picks the outbound interface.
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.connect(("8.8.8.8", 80))
+            return sock.getsockname()[0]
+    except OSError:
+        return "127.0.0.1"
+
+
+class ServerIdentity:
+    """This box's public IP, refreshed in a background thread.
+
+    ``current()`` never blocks on the network: until the first lookup
+    succeeds (or if it keeps failing) it reports the local interface
+    address instead. Failed refreshes keep the last good value and retry
+    after ``retry`` seconds.
+    """
+
+    def __init__(self, resolver=lookup_public_ip, fallback=local_interface_ip, ttl=SERVER_IP_TTL, retry=60):
+        self.resolver = resolver
+        self.fallback = fallback
+        self.ttl = ttl
+        self.retry = retry
+        self._public_ip = None
+        self._local_ip = None
+        self._next_refresh = 0
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    def current(self):
+        with self._lock:
+            if not self._refreshing and time.time() >= self._next_refresh:
+                self._refreshing = True
+                thread = threading.Thread(target=self._refresh, name="server-identity")
+                thread.daemon = True
+                thread.start()
+            if self._public_ip:
+                return self._public_ip
+            if self._local_ip is None:
+                self._local_ip = self.fallback()
+            return f"{self._local_ip} (local)"
+
+    def _refresh(self):
+        try:
+            public_ip = self.resolver()
+        except Exception:
+            public_ip = None
+        with self._lock:
+            if public_ip:
+                self._public_ip = public_ip
+                self._next_refresh = time.time() + self.ttl
+            else:
+                self._next_refresh = time.time() + self.retry
+            self._refreshing = False
+
+
+server_identity = ServerIdentity()
+
+
+# =========================
+# CDN connection pool
+# =========================
+def create_cdn_session():
+    # One keep-alive pool per CDN host keeping up to CDN_POOL_PER_HOST idle
+    # connections. Not pool_block: requests gives no pool timeout, so one
+    # connection that is never returned would hang every later fetch.
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=CDN_POOL_HOSTS,
+        pool_maxsize=CDN_POOL_PER_HOST,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session, adapter
+
+
+def cdn_pool_stats():
+    requests_sent = 0
+    connections = 0
+    pools = cdn_adapter.poolmanager.pools
+    for key in list(pools.keys()):
+        pool = pools.get(key)
+        if pool is not None:
+            requests_sent += pool.num_requests
+            connections += pool.num_connections
+    return {
+        "requests": requests_sent,
+        "connections": connections,
+        "reused": max(requests_sent - connections, 0),
     }
-  </style>
+
+
+cdn_session, cdn_adapter = create_cdn_session()
+
+
+# =========================
+# Video cache
+# =========================
+class ChunkSizer:
+    """Adapts the read size to the stream. Reads return only what has
+    already arrived, so one that comes back full means more is waiting and
+    the next read asks for twice as much; short reads shrink it again."""
+
+    def __init__(self, minimum=STREAM_CHUNK_MIN, maximum=STREAM_CHUNK_MAX):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.size = minimum
+
+    def record(self, n):
+        if n >= self.size and self.size < self.maximum:
+            self.size = min(self.size * 2, self.maximum)
+        elif n < self.size // 4 and self.size > self.minimum:
+            self.size = max(self.size // 2, self.minimum)
+
+
+def iter_upstream(req):
+    """Read a streamed ``requests`` response in adaptive chunks straight
+    from urllib3, skipping iter_content's per-chunk generator layers.
+
+    ``read1`` returns as soon as some bytes are available instead of
+    blocking until the full chunk arrives, so on a slow CDN each chunk is
+    forwarded as soon as it arrives and the sizer sees the real throughput.
+    """
+    sizer = ChunkSizer()
+    while True:
+        chunk = req.raw.read1(sizer.size, decode_content=False)
+        if not chunk:
+            return
+        sizer.record(len(chunk))
+        yield chunk
+
+
+class VideoCache:
+    """Size-capped LRU of finished videos on local disk, keyed by CDN URL.
+
+    Misses are filled by a single download per video per process (see
+    ``VideoFill``). The directory is the source of truth, so several workers can share it:
+    files another worker wrote are adopted on lookup, files another
+    worker evicted are simply misses, and each commit rescans it so the
+    size cap holds for the directory as a whole.
+    """
+
+    # A download in progress writes to its .part file every few seconds, so
+    # one untouched this long was left behind by a process that died.
+    STALE_PART_SECONDS = 3600
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        self._fills = {}
+        os.makedirs(root, exist_ok=True)
+        self._entries, self._size = self._scan()
+
+    def _scan(self):
+        """Videos on disk, least recently used (by atime) first, and their
+        total size. Also removes stale ``.part`` files."""
+        files = []
+        now = time.time()
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            try:
+                st = os.stat(path)
+                # Other workers sharing the directory may be mid-download.
+                if name.endswith(".part") and st.st_mtime < now - self.STALE_PART_SECONDS:
+                    os.remove(path)
+                elif name.endswith(".mp4"):
+                    files.append((st.st_atime, name[:-4], st.st_size))
+            except FileNotFoundError:
+                continue
+        entries = collections.OrderedDict((key, size) for _, key, size in sorted(files))
+        return entries, sum(entries.values())
+
+    def _touch(self, path, st):
+        # atime is the LRU order every worker sees on its next scan; relatime
+        # mounts don't keep it current, so set it. mtime stays the
+        # Last-Modified that send_file reports.
+        try:
+            os.utime(path, (time.time(), st.st_mtime))
+        except FileNotFoundError:
+            pass
+
+    def key(self, url):
+        return hashlib.sha256(url.encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.root, key + ".mp4")
+
+    def lookup(self, url):
+        key = self.key(url)
+        path = self.path(key)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._forget(key)
+                self.misses += 1
+            return None
+        self._touch(path, st)
+        size = st.st_size
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = size
+                self._size += size
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return path
+
+    def fill(self, url):
+        """Return the in-flight download for ``url``, starting one if this
+        is the first reader."""
+        key = self.key(url)
+        with self._lock:
+            fill = self._fills.get(key)
+            if fill is None:
+                fill = VideoFill(self, url, key)
+                self._fills[key] = fill
+                fill.start()
+            else:
+                self.coalesced += 1
+            return fill
+
+    def _commit(self, key, tmp_path):
+        size = os.path.getsize(tmp_path)
+        if size > self.max_bytes:
+            os.remove(tmp_path)
+            return None
+        path = self.path(key)
+        os.replace(tmp_path, path)
+        self._touch(path, os.stat(path))
+        with self._lock:
+            # Every worker fills the same directory, so the cap is checked
+            # against what is on disk, not just what this process wrote.
+            self._entries, self._size = self._scan()
+            self._forget(key)
+            self._entries[key] = size
+            self._size += size
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                oldest, _ = next(iter(self._entries.items()))
+                self._forget(oldest)
+                try:
+                    os.remove(self.path(oldest))
+                except FileNotFoundError:
+                    pass
+        return path
+
+    def _forget(self, key):
+        size = self._entries.pop(key, None)
+        if size is not None:
+            self._size -= size
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": round(100.0 * self.hits / lookups, 1) if lookups else 0.0,
+                "files": len(self._entries),
+                "bytes": self._size,
+            }
+
+
+class VideoFill:
+    """One upstream download shared by every concurrent reader of a video.
+
+    Bytes land in a ``.part`` file as they arrive; readers follow that file
+    from the start, so late joiners catch up from disk and then wait on
+    the condition for new data.
+    """
+
+    def __init__(self, cache, url, key):
+        self.cache = cache
+        self.url = url
+        self.key = key
+        self.path = os.path.join(cache.root, f"{key}.{uuid.uuid4().hex}.part")
+        self.content_type = "video/mp4"
+        self.content_length = None
+        self.written = 0
+        self.started = False
+        self.done = False
+        self.error = None
+        self.cond = threading.Condition()
+
+    def start(self):
+        thread = threading.Thread(target=self._download, name=f"video-fill-{self.key[:8]}")
+        thread.daemon = True
+        thread.start()
+
+    def _download(self):
+        try:
+            with open(self.path, "wb", buffering=0) as f, \
+                    cdn_session.get(self.url, headers={"Accept-Encoding": "identity"}, stream=True, timeout=30) as req:
+                req.raise_for_status()
+                with self.cond:
+                    self.content_type = req.headers.get("content-type", "video/mp4")
+                    if "Content-Length" in req.headers:
+                        self.content_length = int(req.headers["Content-Length"])
+                    self.started = True
+                    self.cond.notify_all()
+                for chunk in iter_upstream(req):
+                    f.write(chunk)
+                    with self.cond:
+                        self.written += len(chunk)
+                        self.cond.notify_all()
+            if self.content_length is not None and self.written != self.content_length:
+                raise IOError(f"Upstream closed after {self.written} of {self.content_length} bytes")
+            with self.cond:
+                self.path = self.cache._commit(self.key, self.path)
+                self.done = True
+                self.cond.notify_all()
+        except Exception as e:
+            with self.cond:
+                self.error = e
+                self.done = True
+                self.cond.notify_all()
+                self._remove()
+        finally:
+            with self.cache._lock:
+                self.cache._fills.pop(self.key, None)
+
+    def _remove(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        self.path = None
+
+    def open_reader(self, timeout=30, start=0):
+        """Return a generator over the video body from byte ``start``, or
+        None if this download can't serve it: it finished but was not kept
+        (too large for the cache), or ``start`` is past what has arrived or
+        past a length the upstream didn't send."""
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.started or self.done, timeout):
+                raise TimeoutError(f"Upstream did not respond within {timeout}s")
+            if self.error:
+                raise self.error
+            if self.path is None:
+                return None
+            if start and (self.content_length is None or start > self.written
+                          or start >= self.content_length):
+                return None
+            f = open(self.path, "rb")
+        f.seek(start)
+        return self._follow(f, timeout, start)
+
+    def _follow(self, f, timeout, pos):
+        sizer = ChunkSizer()
+        with f:
+            while True:
+                with self.cond:
+                    self.cond.wait_for(lambda: self.written > pos or self.done, timeout)
+                    available = self.written
+                    done = self.done
+                    error = self.error
+                if available > pos:
+                    chunk = f.read(min(available - pos, sizer.size))
+                    pos += len(chunk)
+                    sizer.record(len(chunk))
+                    yield chunk
+                elif error:
+                    raise error
+                elif done:
+                    return
+                else:
+                    raise TimeoutError(f"Upstream stalled for {timeout}s")
+
+
+video_cache = VideoCache(VIDEO_CACHE_DIR, VIDEO_CACHE_MAX_BYTES)
+
+
+# =========================
+# Static assets
+# =========================
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+
+
+class AssetRegistry:
+    """Files under ``static/`` loaded once at startup and served under
+    content-hashed names, so browsers can cache them forever.
+
+    Text assets are pre-compressed with brotli and gzip at load time, and
+    ``url(...)`` references inside CSS are rewritten to the hashed names.
+    """
+
+    def __init__(self, root):
+        self._urls = {}
+        self._files = {}
+        paths = []
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                paths.append((os.path.relpath(path, root).replace(os.sep, "/"), path))
+        # CSS last, so the files it references already have hashed URLs.
+        for name, path in sorted(paths, key=lambda item: item[0].endswith(".css")):
+            with open(path, "rb") as f:
+                body = f.read()
+            if name.endswith(".css"):
+                body = self._rewrite_css_urls(name, body)
+            self._add(name, body)
+
+    def _rewrite_css_urls(self, name, body):
+        base = os.path.dirname(name)
+
+        def replace(match):
+            ref = match.group(2)
+            target = os.path.normpath(os.path.join(base, ref)).replace(os.sep, "/")
+            url = self._urls.get(target)
+            return f"url({url})" if url else match.group(0)
+
+        return re.sub(r"url\((['\"]?)([^)'\":]+)\1\)", replace, body.decode()).encode()
+
+    def _add(self, name, body):
+        stem, ext = os.path.splitext(name)
+        digest = hashlib.sha256(body).hexdigest()[:12]
+        hashed = f"{stem}.{digest}{ext}"
+        mimetype = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        encodings = {"identity": body}
+        if mimetype.startswith(COMPRESSIBLE_TYPES):
+            for encoding, compressed in (
+                ("br", brotli.compress(body, quality=11)),
+                ("gzip", gzip.compress(body, compresslevel=9, mtime=0)),
+            ):
+                if len(compressed) < len(body):
+                    encodings[encoding] = compressed
+        self._urls[name] = f"/assets/{hashed}"
+        self._files[hashed] = {"digest": digest, "mimetype": mimetype, "encodings": encodings}
+
+    def exists(self, name):
+        return name in self._urls
+
+    def url(self, name):
+        return self._urls[name]
+
+    def get(self, hashed_name):
+        return self._files.get(hashed_name)
+
+
+assets = AssetRegistry(ASSETS_DIR)
+app.jinja_env.globals["asset_url"] = assets.url
+app.jinja_env.globals["asset_exists"] = assets.exists
+
+
+# =========================
+# HTML Templates
+# =========================
+TEMPLATE = """
+<!doctype html>
+<html lang="en">
+<head>
+  <meta charset="utf-8">
+  <title>SnapStudy AI — Video Synthesis Studio</title>
+  <meta name="viewport" content="width=device-width, initial-scale=1">
+  {% if asset_exists('fonts.css') %}
+  <link rel="stylesheet" href="{{ asset_url('fonts.css') }}">
+  {% else %}
+  <link rel="preconnect" href="https://fonts.googleapis.com">
+  <link rel="preconnect" href="https://fonts.gstatic.com" crossorigin>
+  <link href="https://fonts.googleapis.com/css2?family=Crimson+Pro:wght@400;600;700&family=IBM+Plex+Mono:wght@400;500;600&family=Manrope:wght@400;500;600;700;800&display=swap" rel="stylesheet">
+  {% endif %}
+  
+  <link rel="stylesheet" href="{{ asset_url('studio.css') }}">
 </head>
-<body>
+<body{% if job_id %} data-job-id="{{ job_id }}"{% endif %}>
   <div class="container">
     
     <header class="masthead">
@@ -740,7 +3021,19 @@ TEMPLATE = """
           
           {% if rate_limited %}
           <div class="alert">
-            <p class="alert-text">You've reached your daily limit of 3 videos. Please return tomorrow.</p>
+            <p class="alert-text">You've reached your daily limit of {{ daily_limit }} videos. Please come back later.</p>
+          </div>
+          {% endif %}
+          
+          {% if busy %}
+          <div class="alert">
+            <p class="alert-text">The studio is at capacity ({{ queue_depth }} videos in the queue). Please try again in a minute.</p>
+          </div>
+          {% endif %}
+          
+          {% if upstream_down %}
+          <div class="alert">
+            <p class="alert-text">The video service is having trouble right now. Please try again in a minute.</p>
           </div>
           {% endif %}
           
@@ -754,7 +3047,7 @@ TEMPLATE = """
           
           <div class="meta-info">
             <div class="meta-item">→ Average processing time: 2–3 minutes</div>
-            <div class="meta-item">→ Daily quota: 3 videos per session</div>
+            <div class="meta-item">→ Daily quota: {{ daily_limit }} videos per session</div>
             <div class="meta-item">→ Output format: MP4, branded with attribution</div>
           </div>
         </form>
@@ -796,66 +3089,7 @@ TEMPLATE = """
   </div>
 
   {% if job_id %}
-  <script>
-    const jobId = "{{ job_id }}";
-    
-    function checkStatus() {
-      fetch('/status/' + jobId)
-        .then(res => res.json())
-        .then(data => {
-          const progressText = document.getElementById('progressText');
-          const canvas = document.getElementById('canvas');
-          
-          if (progressText) {
-            progressText.textContent = data.progress || 'Processing...';
-          }
-          
-          if (data.status === 'completed') {
-            canvas.innerHTML = `
-              <div class="video-complete">
-                <video controls playsinline>
-                  <source src="${data.video_url}" type="video/mp4">
-                </video>
-                <h3>Synthesis Complete</h3>
-                <p>Your video is ready for download and distribution.</p>
-                <div class="video-actions">
-                  <a href="${data.video_url}" download="snapstudy-ai-video.mp4" class="btn-download">
-                    Download Video
-                  </a>
-                </div>
-                <div class="credit">
-                  Attribution applied: "By Chirag Rathi"
-                </div>
-              </div>
-            `;
-          } else if (data.status === 'failed') {
-            canvas.innerHTML = `
-              <div class="error-state">
-                <div class="error-icon">
-                  <svg fill="none" viewBox="0 0 24 24">
-                    <path stroke-linecap="round" stroke-linejoin="round" d="M12 9v3.75m9-.75a9 9 0 11-18 0 9 9 0 0118 0zm-9 3.75h.008v.008H12v-.008z"/>
-                  </svg>
-                </div>
-                <h3>Synthesis Failed</h3>
-                <p>An error occurred during processing. Please try again with different input.</p>
-                <details class="error-details">
-                  <summary style="cursor: pointer; font-weight: 600; margin-bottom: 0.5rem;">Technical Details</summary>
-                  <pre style="white-space: pre-wrap; word-wrap: break-word;">${data.error}</pre>
-                </details>
-              </div>
-            `;
-          } else {
-            setTimeout(checkStatus, 3000);
-          }
-        })
-        .catch(err => {
-          console.error('Status check failed:', err);
-          setTimeout(checkStatus, 5000);
-        });
-    }
-    
-    checkStatus();
-  </script>
+  <script src="{{ asset_url('studio.js') }}"></script>
   {% endif %}
 </body>
 </html>
@@ -869,259 +3103,13 @@ ADMIN_TEMPLATE = """
   <meta charset="utf-8">
   <title>Control Room — SnapStudy AI</title>
   <meta name="viewport" content="width=device-width, initial-scale=1">
+  {% if asset_exists('fonts.css') %}
+  <link rel="stylesheet" href="{{ asset_url('fonts.css') }}">
+  {% else %}
   <link href="https://fonts.googleapis.com/css2?family=Crimson+Pro:wght@600;700&family=IBM+Plex+Mono:wght@400;500;600&family=Manrope:wght@600;700;800&display=swap" rel="stylesheet">
+  {% endif %}
   
-  <style>
-    :root {
-      --terminal-bg: #0a0a0a;
-      --terminal-text: #00ff41;
-      --terminal-dim: #007a1f;
-      --warning: #ff9500;
-      --danger: #ff3b30;
-      --info: #00c7ff;
-    }
-    
-    * {
-      margin: 0;
-      padding: 0;
-      box-sizing: border-box;
-    }
-    
-    body {
-      font-family: 'IBM Plex Mono', monospace;
-      background: var(--terminal-bg);
-      color: var(--terminal-text);
-      padding: 2rem;
-      line-height: 1.6;
-    }
-    
-    body::before {
-      content: '';
-      position: fixed;
-      top: 0;
-      left: 0;
-      width: 100%;
-      height: 100%;
-      background: repeating-linear-gradient(
-        0deg,
-        rgba(0, 255, 65, 0.03),
-        rgba(0, 255, 65, 0.03) 1px,
-        transparent 1px,
-        transparent 2px
-      );
-      pointer-events: none;
-      z-index: 9999;
-    }
-    
-    @keyframes flicker {
-      0%, 100% { opacity: 1; }
-      50% { opacity: 0.97; }
-    }
-    
-    body {
-      animation: flicker 0.15s infinite;
-    }
-    
-    .container {
-      max-width: 1600px;
-      margin: 0 auto;
-    }
-    
-    .header {
-      border: 2px solid var(--terminal-text);
-      padding: 2rem;
-      margin-bottom: 2rem;
-      position: relative;
-    }
-    
-    .header::before {
-      content: '[ CLASSIFIED ]';
-      position: absolute;
-      top: -12px;
-      left: 20px;
-      background: var(--terminal-bg);
-      padding: 0 10px;
-      font-size: 0.75rem;
-      color: var(--danger);
-      letter-spacing: 0.2em;
-    }
-    
-    .header h1 {
-      font-family: 'Manrope', sans-serif;
-      font-size: 2.5rem;
-      font-weight: 800;
-      letter-spacing: -0.02em;
-      margin-bottom: 0.5rem;
-      text-transform: uppercase;
-    }
-    
-    .header .subtitle {
-      color: var(--terminal-dim);
-      font-size: 0.9rem;
-    }
-    
-    .status-indicator {
-      display: inline-flex;
-      align-items: center;
-      gap: 0.5rem;
-      margin-top: 1rem;
-      font-size: 0.85rem;
-    }
-    
-    .pulse-dot {
-      width: 8px;
-      height: 8px;
-      background: var(--terminal-text);
-      border-radius: 50%;
-      animation: pulse 2s ease-in-out infinite;
-    }
-    
-    @keyframes pulse {
-      0%, 100% { opacity: 1; }
-      50% { opacity: 0.3; }
-    }
-    
-    .stats-grid {
-      display: grid;
-      grid-template-columns: repeat(auto-fit, minmax(300px, 1fr));
-      gap: 1.5rem;
-      margin-bottom: 3rem;
-    }
-    
-    .stat-card {
-      border: 1px solid var(--terminal-dim);
-      padding: 1.5rem;
-      position: relative;
-      background: rgba(0, 255, 65, 0.02);
-    }
-    
-    .stat-card::before {
-      content: '';
-      position: absolute;
-      top: 0;
-      left: 0;
-      width: 4px;
-      height: 100%;
-      background: var(--terminal-text);
-    }
-    
-    .stat-label {
-      font-size: 0.75rem;
-      text-transform: uppercase;
-      letter-spacing: 0.15em;
-      color: var(--terminal-dim);
-      margin-bottom: 0.75rem;
-    }
-    
-    .stat-value {
-      font-family: 'Manrope', sans-serif;
-      font-size: 2.5rem;
-      font-weight: 700;
-      line-height: 1;
-    }
-    
-    .stat-meta {
-      margin-top: 0.5rem;
-      font-size: 0.8rem;
-      color: var(--terminal-dim);
-    }
-    
-    .table-container {
-      border: 2px solid var(--terminal-text);
-      overflow: hidden;
-      margin-bottom: 2rem;
-    }
-    
-    .table-header {
-      background: var(--terminal-text);
-      color: var(--terminal-bg);
-      padding: 1rem 1.5rem;
-      font-weight: 700;
-      text-transform: uppercase;
-      letter-spacing: 0.1em;
-      font-size: 0.85rem;
-    }
-    
-    table {
-      width: 100%;
-      border-collapse: collapse;
-    }
-    
-    thead {
-      background: rgba(0, 255, 65, 0.1);
-    }
-    
-    th {
-      padding: 1rem 1.5rem;
-      text-align: left;
-      font-weight: 600;
-      font-size: 0.75rem;
-      text-transform: uppercase;
-      letter-spacing: 0.1em;
-      border-bottom: 1px solid var(--terminal-dim);
-    }
-    
-    td {
-      padding: 1rem 1.5rem;
-      border-bottom: 1px solid rgba(0, 122, 31, 0.3);
-      font-size: 0.85rem;
-    }
-    
-    tr:hover {
-      background: rgba(0, 255, 65, 0.05);
-    }
-    
-    .status-badge {
-      display: inline-block;
-      padding: 0.25rem 0.75rem;
-      font-size: 0.7rem;
-      font-weight: 600;
-      text-transform: uppercase;
-      letter-spacing: 0.05em;
-      border: 1px solid;
-    }
-    
-    .status-success {
-      color: var(--terminal-text);
-      border-color: var(--terminal-text);
-      background: rgba(0, 255, 65, 0.1);
-    }
-    
-    .status-failed {
-      color: var(--danger);
-      border-color: var(--danger);
-      background: rgba(255, 59, 48, 0.1);
-    }
-    
-    .ip-address {
-      font-family: 'IBM Plex Mono', monospace;
-      color: var(--info);
-      font-weight: 500;
-    }
-    
-    .truncate {
-      max-width: 300px;
-      white-space: nowrap;
-      overflow: hidden;
-      text-overflow: ellipsis;
-    }
-    
-    .empty-state {
-      padding: 4rem 2rem;
-      text-align: center;
-      color: var(--terminal-dim);
-      border: 1px dashed var(--terminal-dim);
-    }
-    
-    .footer {
-      text-align: center;
-      padding: 2rem;
-      color: var(--terminal-dim);
-      font-size: 0.75rem;
-      border-top: 1px solid var(--terminal-dim);
-      margin-top: 3rem;
-    }
-  </style>
+  <link rel="stylesheet" href="{{ asset_url('admin.css') }}">
 </head>
 <body>
   <div class="container">
@@ -1138,7 +3126,7 @@ ADMIN_TEMPLATE = """
     <div class="stats-grid">
       <div class="stat-card">
         <div class="stat-label">Total Requests Logged</div>
-        <div class="stat-value">{{ logs|length }}</div>
+        <div class="stat-value">{{ log_count }}</div>
         <div class="stat-meta">Since system initialization</div>
       </div>
       
@@ -1150,13 +3138,74 @@ ADMIN_TEMPLATE = """
       
       <div class="stat-card">
         <div class="stat-label">Active IP Sessions (24h)</div>
-        <div class="stat-value">{{ ip_requests|length }}</div>
+        <div class="stat-value">{{ ip_count }}</div>
         <div class="stat-meta">Unique client connections today</div>
       </div>
+      
+      <div class="stat-card">
+        <div class="stat-label">Video Cache Hit Rate</div>
+        <div class="stat-value">{{ video_cache.hit_rate }}%</div>
+        <div class="stat-meta">{{ video_cache.hits }} hits / {{ video_cache.misses }} misses ({{ video_cache.coalesced }} shared) — {{ video_cache.files }} files, {{ (video_cache.bytes / 1048576)|round(1) }} MB</div>
+      </div>
+      
+      <div class="stat-card">
+        <div class="stat-label">Topic Cache Hit Rate</div>
+        <div class="stat-value">{{ result_cache.hit_rate }}%</div>
+        <div class="stat-meta">{{ result_cache.hits }} hits / {{ result_cache.misses }} misses — {{ result_cache.entries }} topics cached</div>
+      </div>
+      
+      <div class="stat-card">
+        <div class="stat-label">CDN Connections Reused</div>
+        <div class="stat-value">{{ cdn_pool.reused }}</div>
+        <div class="stat-meta">{{ cdn_pool.requests }} requests over {{ cdn_pool.connections }} connections — handshakes avoided</div>
+      </div>
+      
+      <div class="stat-card">
+        <div class="stat-label">Upstream Circuit</div>
+        <div class="stat-value">{{ breaker.state|replace('_', '-')|upper }}</div>
+        <div class="stat-meta">{{ breaker.failures }} consecutive failures — opened {{ breaker.opened }} times{% if breaker.retry_in %} — probe in {{ breaker.retry_in }}s{% endif %}</div>
+      </div>
+    </div>
+    
+    <div class="table-container">
+      <div class="table-header">Pipeline Stage Timings (seconds)</div>
+      <table>
+        <thead>
+          <tr>
+            <th>Stage</th>
+            <th>Samples</th>
+            <th>p50</th>
+            <th>p95</th>
+            <th>p99</th>
+          </tr>
+        </thead>
+        <tbody>
+          {% for row in stage_timings %}
+          <tr>
+            <td>{{ row.stage }}</td>
+            <td>{{ row.samples }}</td>
+            <td>{{ row.p50 if row.samples else '—' }}</td>
+            <td>{{ row.p95 if row.samples else '—' }}</td>
+            <td>{{ row.p99 if row.samples else '—' }}</td>
+          </tr>
+          {% endfor %}
+        </tbody>
+      </table>
     </div>
     
     <div class="table-container">
       <div class="table-header">Request Activity Log</div>
+      <form class="log-filters" method="GET" action="{{ url_for('admin_page') }}">
+        <select name="status">
+          <option value="">All statuses</option>
+          <option value="success" {% if filters.status == 'success' %}selected{% endif %}>Success</option>
+          <option value="fail" {% if filters.status == 'fail' %}selected{% endif %}>Failed</option>
+        </select>
+        <input type="text" name="ip" placeholder="Client IP" value="{{ filters.ip or '' }}">
+        <input type="text" name="topic" placeholder="Topic" value="{{ filters.topic or '' }}">
+        <button type="submit">Filter</button>
+        {% if filters.status or filters.ip or filters.topic %}<a href="{{ url_for('admin_page') }}">Clear</a>{% endif %}
+      </form>
       <table>
         <thead>
           <tr>
@@ -1169,7 +3218,7 @@ ADMIN_TEMPLATE = """
         </thead>
         <tbody>
           {% if logs %}
-            {% for row in logs|reverse %}
+            {% for row in logs %}
             <tr>
               <td>{{ row.timestamp }}</td>
               <td><span class="ip-address">{{ row.ip }}</span></td>
@@ -1194,6 +3243,9 @@ ADMIN_TEMPLATE = """
           {% endif %}
         </tbody>
       </table>
+      {% if next_page_url %}
+      <div class="log-pager"><a href="{{ next_page_url }}">Older entries →</a></div>
+      {% endif %}
     </div>
     
     <div class="footer">
@@ -1207,41 +3259,120 @@ ADMIN_TEMPLATE = """
 """
 
 
+# Compiled once here instead of on every request.
+INDEX_PAGE = app.jinja_env.from_string(TEMPLATE)
+ADMIN_PAGE = app.jinja_env.from_string(ADMIN_TEMPLATE)
+
+
 # =========================
 # Routes
 # =========================
+@app.before_request
+def start_route_timer():
+    g.route_started = time.perf_counter()
+
+
+@app.after_request
+def record_route_time(response):
+    if "route_started" in g:
+        rule = request.url_rule.rule if request.url_rule else "unmatched"
+        route_seconds.observe(rule, time.perf_counter() - g.route_started)
+    return response
+
+
+def submit_job(topic, user_ip):
+    """Attach to a running job for the same topic or queue a new one.
+
+    Returns ``(job_id, None)`` on success or ``(None, reason)`` with reason
+    ``"busy"``, ``"upstream_down"`` or ``"rate_limited"``. Attaching costs no quota since no
+    upstream work is started.
+    """
+    key = topic_cache_key(topic)
+    job_id = str(uuid.uuid4())
+    if inflight.attach(key, job_id, new_job(topic), user_ip):
+        return job_id, None
+    if pipeline_runner.is_full():
+        return None, "busy"
+    # Peek first so no quota is spent while the upstream is down, and take
+    # the half-open probe only once this submission will really start a job.
+    if upstream_breaker.refusing():
+        return None, "upstream_down"
+    if not check_rate_limit(user_ip):
+        rate_limit_rejections.inc("route")
+        return None, "rate_limited"
+    if not upstream_breaker.allow():
+        return None, "upstream_down"
+    if not inflight.lead(key, job_id, new_job(topic), user_ip):
+        return job_id, None
+    
+    jobs.create(job_id, dict(new_job(topic, user_ip), lease=leases.lease(job_id)))
+    try:
+        if PIPELINE_MODE == "async":
+            async_pipeline.submit(job_id, topic, user_ip)
+        else:
+            scheduler.submit(job_id, process_video_generation, job_id, topic, user_ip)
+    except JobQueueFull as e:
+        error_msg = f"{type(e).__name__}: {str(e)}"
+        update_job(job_id, status="failed", error=error_msg, progress="Failed")
+        inflight.release(job_id, "fail", error_msg)
+        jobs.delete(job_id)
+        return None, "busy"
+    return job_id, None
+
+
 @app.route("/", methods=["GET", "POST"])
 def index():
     user_ip = get_real_ip(request)
     topic = ""
     job_id = None
     rate_limited = False
+    busy = False
+    upstream_down = False
 
     if request.method == "POST":
         if not validate_request_origin():
             return jsonify({"error": "Unauthorized domain"}), 403
         
         topic = (request.form.get("topic") or "").strip()
+        cached_url = result_cache.get(topic_cache_key(topic)) if topic else None
         if not topic:
             pass
+        elif cached_url:
+            # Already rendered: no upstream work, so no quota either.
+            job_id = str(uuid.uuid4())
+            now = time.time()
+            jobs.create(job_id, dict(
+                new_job(topic),
+                status="completed",
+                original_url=cached_url,
+                video_url=f"/video/{job_id}",
+                progress="Done!",
+                cached=True,
+                started_at=now,
+                finished_at=now,
+            ))
+            log_request(user_ip, topic, "success", "")
         else:
-            if not check_rate_limit(user_ip):
-                rate_limited = True
-            else:
-                job_id = str(uuid.uuid4())
-                thread = threading.Thread(
-                    target=process_video_generation,
-                    args=(job_id, topic, user_ip)
-                )
-                thread.daemon = True
-                thread.start()
+            job_id, refusal = submit_job(topic, user_ip)
+            busy = refusal == "busy"
+            upstream_down = refusal == "upstream_down"
+            rate_limited = refusal == "rate_limited"
 
-    return render_template_string(
-        TEMPLATE,
+    page = render_template(
+        INDEX_PAGE,
         topic=topic,
         job_id=job_id,
         rate_limited=rate_limited,
+        busy=busy,
+        upstream_down=upstream_down,
+        queue_depth=pipeline_runner.depth(),
+        daily_limit=RATE_LIMIT_PER_DAY,
     )
+    if busy:
+        return page, 503, {"Retry-After": "30"}
+    if upstream_down:
+        return page, 503, {"Retry-After": str(upstream_breaker.retry_after())}
+    return page
 
 
 @app.route("/status/<job_id>", methods=["GET"])
@@ -1249,55 +3380,269 @@ def job_status(job_id):
     if not validate_request_origin():
         return jsonify({"error": "Unauthorized domain"}), 403
     
-    job = stats["jobs"].get(job_id)
+    job = jobs.get(job_id)
     if not job:
         return jsonify({"status": "not_found"}), 404
-    return jsonify(job)
+    return jsonify(public_job(job_id, job, include_trace=request.args.get("trace") == "1"))
+
+
+@app.route("/events/<job_id>", methods=["GET"])
+def job_events(job_id):
+    if not validate_request_origin():
+        return jsonify({"error": "Unauthorized domain"}), 403
+    
+    if not jobs.get(job_id):
+        return jsonify({"status": "not_found"}), 404
+    
+    # studio.js falls back to polling /status when the stream is refused.
+    if not event_streams.acquire(blocking=False):
+        return jsonify({"error": "Too many open event streams"}), 503, {"Retry-After": "30"}
+    
+    def generate():
+        with progress_hub.subscribe(job_id) as subscription:
+            last_event = None
+            last_sent = 0
+            while True:
+                job = jobs.get(job_id)
+                if not job:
+                    yield 'event: end\ndata: {"status": "not_found"}\n\n'
+                    return
+                event = json.dumps(public_job(job_id, job))
+                if event != last_event:
+                    yield f"data: {event}\n\n"
+                    last_event = event
+                    last_sent = time.time()
+                elif time.time() - last_sent >= EVENTS_KEEPALIVE_SECONDS:
+                    yield ": keepalive\n\n"
+                    last_sent = time.time()
+                if job["status"] in TERMINAL_STATUSES:
+                    return
+                # Queue positions and jobs running in another worker are
+                # not published to this process, so recheck the store.
+                if job["status"] == "queued" or STATE_BACKEND != "memory":
+                    subscription.wait(2)
+                else:
+                    subscription.wait(EVENTS_KEEPALIVE_SECONDS)
+    
+    response = Response(
+        stream_with_context(generate()),
+        content_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        }
+    )
+    # Runs when the server closes the response, even if it was never iterated.
+    response.call_on_close(event_streams.release)
+    return response
+
+
+PRIVATE_JOB_FIELDS = ("checkpoint", "lease", "user_ip")
+
+
+def public_job(job_id, job, include_trace=False):
+    job = {k: v for k, v in job.items() if k not in PRIVATE_JOB_FIELDS}
+    trace = job.pop("trace", None)
+    if include_trace:
+        job["trace"] = trace
+    if job["status"] == "queued":
+        position = pipeline_runner.position(job.get("leader_id") or job_id)
+        if position:
+            job = dict(job, queue_position=position, progress=f"Queued (position {position})...")
+    return job
+
+
+OPEN_RANGE_RE = re.compile(r"bytes=(\d+)-")
+
+
+def open_range_start(range_header):
+    """Start offset of a single open-ended ``bytes=N-`` range, else None."""
+    match = OPEN_RANGE_RE.fullmatch(range_header.strip())
+    return int(match.group(1)) if match else None
 
 
-@app.route("/video/<job_id>", methods=["GET"])
+@app.route("/video/<job_id>", methods=["GET", "HEAD"])
 def stream_video(job_id):
-    job = stats["jobs"].get(job_id)
+    job = jobs.get(job_id)
     if not job or not job.get("original_url"):
         return "Video not found", 404
     
     original_url = job["original_url"]
+    filename = f"snapstudy-ai-{job_id[:8]}.mp4"
+    
+    cached_path = video_cache.lookup(original_url)
+    if cached_path:
+        # send_file handles Range/HEAD/conditional requests and hands the
+        # file to the server's sendfile path via wsgi.file_wrapper.
+        resp = send_file(
+            cached_path,
+            mimetype="video/mp4",
+            download_name=filename,
+            conditional=True,
+            etag=video_cache.key(original_url),
+            max_age=31536000,
+        )
+        if request.method == "GET" and resp.status_code in (200, 206):
+            video_bytes.inc("cache", resp.content_length or 0)
+        return resp
+    
+    # Whole-file GETs and open-ended ranges ("bytes=0-" is how players
+    # start) join the shared download of this video once it has reached the
+    # requested offset. Other ranges, and seeks ahead of the download, are
+    # passed straight through, so they only pull the requested bytes.
+    range_header = request.headers.get("Range")
+    start = open_range_start(range_header) if range_header else 0
+    if request.method == "GET" and start is not None:
+        fill = video_cache.fill(original_url)
+        try:
+            body = fill.open_reader(start=start)
+        except Exception as e:
+            return f"Error streaming video: {str(e)}", 500
+        if body is not None:
+            headers = {
+                'Content-Disposition': f'inline; filename="{filename}"',
+                'Accept-Ranges': 'bytes',
+                'Cache-Control': 'public, max-age=31536000',
+            }
+            if fill.content_length is not None:
+                headers['Content-Length'] = str(fill.content_length - start)
+            if range_header:
+                headers['Content-Range'] = f"bytes {start}-{fill.content_length - 1}/{fill.content_length}"
+            return Response(
+                stream_with_context(count_video_bytes(body, "fill")),
+                status=206 if range_header else 200,
+                content_type=fill.content_type,
+                headers=headers,
+            )
+    
+    upstream_headers = {"Accept-Encoding": "identity"}
+    if request.headers.get("Range"):
+        upstream_headers["Range"] = request.headers["Range"]
     
+    req = None
     try:
-        req = requests.get(original_url, stream=True, timeout=30)
+        if request.method == "HEAD":
+            req = cdn_session.head(original_url, headers=upstream_headers, allow_redirects=True, timeout=30)
+        else:
+            req = cdn_session.get(original_url, headers=upstream_headers, stream=True, timeout=30)
+        
+        if req.status_code == 416:
+            req.close()
+            return Response(
+                status=416,
+                headers={'Content-Range': req.headers.get('Content-Range', 'bytes */*')}
+            )
         req.raise_for_status()
         
-        def generate():
-            for chunk in req.iter_content(chunk_size=8192):
-                if chunk:
-                    yield chunk
+        headers = {
+            'Content-Disposition': f'inline; filename="{filename}"',
+            'Accept-Ranges': 'bytes',
+            'Cache-Control': 'public, max-age=31536000',
+        }
+        for name in ('Content-Length', 'Content-Range', 'ETag', 'Last-Modified'):
+            if name in req.headers:
+                headers[name] = req.headers[name]
+        content_type = req.headers.get('content-type', 'video/mp4')
         
-        return Response(
-            stream_with_context(generate()),
-            content_type=req.headers.get('content-type', 'video/mp4'),
-            headers={
-                'Content-Disposition': f'inline; filename="snapstudy-ai-{job_id[:8]}.mp4"',
-                'Accept-Ranges': 'bytes',
-                'Cache-Control': 'public, max-age=31536000',
-            }
+        if request.method == "HEAD":
+            return Response(status=req.status_code, content_type=content_type, headers=headers)
+        
+        response = Response(
+            stream_with_context(count_video_bytes(iter_upstream(req), "upstream")),
+            status=req.status_code,
+            content_type=content_type,
+            headers=headers
         )
+        # Runs when the server closes the response, even if the body was
+        # never iterated, so the connection always goes back to the pool.
+        response.call_on_close(req.close)
+        return response
     except Exception as e:
+        if req is not None:
+            req.close()
         return f"Error streaming video: {str(e)}", 500
 
 
+@app.route("/assets/<path:name>", methods=["GET"])
+def static_asset(name):
+    asset = assets.get(name)
+    if asset is None:
+        return "Not found", 404
+    
+    encoding = "identity"
+    for candidate in ("br", "gzip"):
+        if candidate in asset["encodings"] and request.accept_encodings[candidate]:
+            encoding = candidate
+            break
+    
+    response = Response(
+        asset["encodings"][encoding],
+        mimetype=asset["mimetype"],
+        headers={
+            'Cache-Control': 'public, max-age=31536000, immutable',
+            'Vary': 'Accept-Encoding',
+        }
+    )
+    if encoding != "identity":
+        response.headers['Content-Encoding'] = encoding
+    # Each encoding is a different byte sequence, so it gets its own strong ETag.
+    response.set_etag(asset["digest"] if encoding == "identity" else f'{asset["digest"]}-{encoding}')
+    return response.make_conditional(request)
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    # Per process: with several gunicorn workers each scrape sees one worker.
+    return Response(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.route("/XYZ", methods=["GET"])
 def admin_page():
-    try:
-        server_ip = requests.get("https://api.ipify.org", timeout=10).text.strip()
-    except Exception as e:
-        server_ip = f"ERROR: {str(e)}"
+    server_ip = server_identity.current()
+    filters = {k: request.args.get(k, "").strip() for k in ("status", "ip", "topic")}
+    logs, next_cursor = state.query_logs(
+        before=request.args.get("cursor", type=int),
+        limit=ADMIN_LOG_PAGE_SIZE,
+        **filters
+    )
+    next_page_url = None
+    if next_cursor:
+        next_page_url = url_for("admin_page", cursor=next_cursor, **{k: v for k, v in filters.items() if v})
     
-    return render_template_string(
-        ADMIN_TEMPLATE,
+    return render_template(
+        ADMIN_PAGE,
         server_ip=server_ip,
-        logs=stats["logs"],
-        ip_requests=stats["ip_requests"],
+        logs=logs,
+        log_count=state.log_count(),
+        filters=filters,
+        next_page_url=next_page_url,
+        ip_count=state.ip_count(),
+        video_cache=video_cache.stats(),
+        cdn_pool=cdn_pool_stats(),
+        result_cache=result_cache.stats(),
+        stage_timings=stage_timings(),
+        breaker=upstream_breaker.stats(),
+    )
+
+
+@app.route("/XYZ/logs", methods=["GET"])
+def admin_logs_api():
+    logs, next_cursor = state.query_logs(
+        status=request.args.get("status", "").strip(),
+        ip=request.args.get("ip", "").strip(),
+        topic=request.args.get("topic", "").strip(),
+        before=request.args.get("cursor", type=int),
+        limit=max(1, min(request.args.get("limit", ADMIN_LOG_PAGE_SIZE, type=int), 500)),
     )
+    return jsonify({"logs": logs, "next_cursor": next_cursor})
+
+
+app.wsgi_app = FrontFilter(app.wsgi_app)
+
+# gunicorn imports the app in each worker (no --preload), so every worker
+# runs its own lease heartbeat and recovery pass from startup.
+if leases.enabled:
+    leases.start()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,485 @@
+"""Offline load benchmark.
+
+Starts a local fake of the NoteGPT endpoints the pipeline calls (init,
+``/status``, ``/script/get``, ``/script/edit``) plus a fake CDN. It then
+drives the app the way a browser would: submit a topic through ``POST /``,
+poll ``/status/<job_id>`` until the job finishes, and download
+``/video/<job_id>``. The report covers throughput, latency percentiles,
+and the app process's thread count and RSS.
+
+By default the app runs in this process behind werkzeug's threaded server.
+The thread figures then leave out the driver's and the fake's threads, but
+RSS still includes them. To measure a real deployment, start it with ``NOTEGPT_BASE``
+pointing at a fake and pass ``--url`` (and ``--pid`` for threads/RSS):
+
+    python benchmark.py --fake-only --fake-port 9100 &
+    NOTEGPT_BASE=http://127.0.0.1:9100/api/v2/pdf-to-video gunicorn ... app:app
+    python benchmark.py --url http://127.0.0.1:10000 --pid <gunicorn worker pid>
+
+``--workers N`` does that in one step: it runs the app under gunicorn
+(gthread, 8 threads, as in the Dockerfile) with N workers sharing SQLite
+state, and sums threads/RSS over the workers. Compare throughput across
+worker counts with the same load:
+
+    python benchmark.py --workers 1 --jobs 200 --concurrency 50
+    python benchmark.py --workers 4 --jobs 200 --concurrency 50
+
+``--mode`` picks the pipeline. To compare what 1,000 jobs waiting on the
+upstream at once cost in each mode, keep them all in flight with a long
+render and measure one worker so the driver is left out:
+
+    python benchmark.py --workers 1 --mode threaded --jobs 1000 --concurrency 1000 \
+        --render-seconds 60 --poll-interval 5 --no-download
+    python benchmark.py --workers 1 --mode async --jobs 1000 --concurrency 1000 \
+        --render-seconds 60 --poll-interval 5 --no-download
+
+Linux only for thread/RSS sampling (reads /proc).
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+API_PATH = "/api/v2/pdf-to-video"
+DEFAULT_ORIGIN = "https://snapstudy-ai.onrender.com"
+JOB_ID_RE = re.compile(r'data-job-id="([^"]+)"')
+
+
+# =========================
+# Fake upstream
+# =========================
+class _FakeServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def process_request(self, request, client_address):
+        # Named so samplers can tell the fake's connections from the app's threads.
+        thread = threading.Thread(target=self.process_request_thread, args=(request, client_address),
+                                  name="fake-upstream-conn")
+        thread.daemon = True
+        thread.start()
+
+
+class FakeUpstream:
+    """In-memory stand-in for NoteGPT and its CDN.
+
+    ``latency`` delays every API response, ``script_seconds`` and
+    ``render_seconds`` are how long the two waits take, ``failure_rate``
+    is the chance that an init or a render fails, and ``video_bytes`` is
+    the size of every rendered video.
+    """
+
+    def __init__(self, latency=0.05, script_seconds=2.0, render_seconds=10.0, failure_rate=0.0,
+                 video_bytes=5 * 1024 * 1024):
+        self.latency = latency
+        self.script_seconds = script_seconds
+        self.render_seconds = render_seconds
+        self.failure_rate = failure_rate
+        self.video_bytes = video_bytes
+        self.conversations = {}
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    def start(self, port=0):
+        self._server = _FakeServer(("127.0.0.1", port), self._handler())
+        thread = threading.Thread(target=self._server.serve_forever, name="fake-upstream")
+        thread.daemon = True
+        thread.start()
+        return f"http://127.0.0.1:{self._server.server_port}{API_PATH}"
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+                fake._count()
+                time.sleep(fake.latency)
+                path = urlparse(self.path).path
+                if path == API_PATH:
+                    self._json(fake.init())
+                elif path == f"{API_PATH}/script/edit":
+                    self._json(fake.render(body.get("conversation_id")))
+                else:
+                    self._json({"code": 404}, 404)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path.startswith("/cdn/"):
+                    return self._video(send_body=True)
+                fake._count()
+                time.sleep(fake.latency)
+                cid = (parse_qs(url.query).get("conversation_id") or [""])[0]
+                if url.path == f"{API_PATH}/status":
+                    self._json(fake.status(cid, f"http://{self.headers['Host']}"))
+                elif url.path == f"{API_PATH}/script/get":
+                    self._json({"code": 100000, "data": {"scenes": [{"scene_text": "Benchmark scene"}]}})
+                else:
+                    self._json({"code": 404}, 404)
+
+            def do_HEAD(self):
+                self._video(send_body=False)
+
+            def _json(self, obj, status=200):
+                data = json.dumps(obj).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _video(self, send_body):
+                self.send_response(200)
+                self.send_header("Content-Type", "video/mp4")
+                self.send_header("Content-Length", str(fake.video_bytes))
+                self.end_headers()
+                if send_body:
+                    chunk = bytes(64 * 1024)
+                    remaining = fake.video_bytes
+                    while remaining > 0:
+                        self.wfile.write(chunk[:remaining])
+                        remaining -= len(chunk)
+
+        return Handler
+
+    def _count(self):
+        with self._lock:
+            self.requests += 1
+
+    def init(self):
+        if random.random() < self.failure_rate:
+            return {"code": 500001, "message": "fake init failure"}
+        cid = uuid.uuid4().hex
+        with self._lock:
+            self.conversations[cid] = {"created": time.time(), "render": None, "fails": False}
+        return {"code": 100000, "data": {"conversation_id": cid}}
+
+    def render(self, cid):
+        with self._lock:
+            conv = self.conversations.get(cid)
+            if conv is None:
+                return {"code": 404, "message": "unknown conversation"}
+            conv["render"] = time.time()
+            conv["fails"] = random.random() < self.failure_rate
+        return {"code": 100000}
+
+    def status(self, cid, origin):
+        conv = self.conversations.get(cid)
+        if conv is None:
+            return {"code": 404, "data": {}}
+        now = time.time()
+        if conv["render"] is None:
+            ready = now - conv["created"] >= self.script_seconds
+            return {"code": 100000, "data": {"step": "edit_script" if ready else "generate_script"}}
+        if now - conv["render"] < self.render_seconds:
+            return {"code": 100000, "data": {"status": "processing"}}
+        if conv["fails"]:
+            return {"code": 100000, "data": {"status": "failed"}}
+        return {"code": 100000, "data": {"status": "success", "cdn_video_url": f"{origin}/cdn/{cid}.mp4"}}
+
+
+# =========================
+# Load driver
+# =========================
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+def proc_stats(pid):
+    """``(threads, rss_mb)`` from /proc, or ``(None, None)`` elsewhere."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+    except OSError:
+        return None, None
+    return int(fields["Threads"]), int(fields["VmRSS"].split()[0]) / 1024
+
+
+class Sampler:
+    """Samples threads and RSS of ``pids`` (summed) while the run is going.
+
+    ``samples`` keeps ``(seconds, threads, rss_mb)`` so a run can show both
+    stayed flat under load, not just their peaks. ``foreign`` counts threads
+    in the process that are not the app's (the driver and fake when
+    in-process); they are left out of the thread figures.
+    """
+
+    def __init__(self, pids, interval=0.5, foreign=None):
+        self.pids = pids
+        self.interval = interval
+        self.foreign = foreign
+        self.peak_threads = None
+        self.peak_rss_mb = None
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampler")
+        self._thread.daemon = True
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        started = time.perf_counter()
+        while True:
+            stats = [proc_stats(pid) for pid in self.pids]
+            if stats and all(threads is not None for threads, _ in stats):
+                threads = sum(threads for threads, _ in stats)
+                rss_mb = sum(rss_mb for _, rss_mb in stats)
+                if self.foreign is not None:
+                    threads -= self.foreign()
+                self.samples.append((time.perf_counter() - started, threads, rss_mb))
+                self.peak_threads = max(self.peak_threads or 0, threads)
+                self.peak_rss_mb = max(self.peak_rss_mb or 0, rss_mb)
+            if self._stop.wait(self.interval):
+                return
+
+
+def worker_pids(master_pid):
+    """Pids of a gunicorn master's workers (its child processes)."""
+    try:
+        with open(f"/proc/{master_pid}/task/{master_pid}/children") as f:
+            return [int(pid) for pid in f.read().split()]
+    except OSError:
+        return []
+
+
+def start_gunicorn(workers, env, timeout=30):
+    """Run the app under gunicorn the way the Dockerfile does, with
+    ``workers`` gthread workers; returns ``(process, base_url, worker_pids)``."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{port}", "--worker-class", "gthread",
+         "--threads", "8", "--workers", str(workers), "--log-level", "warning", "app:app"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=dict(os.environ, **env),
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + timeout
+    while True:
+        pids = worker_pids(process.pid)
+        try:
+            if len(pids) == workers and requests.get(f"{base_url}/", timeout=5).ok:
+                return process, base_url, pids
+        except requests.ConnectionError:
+            pass
+        if process.poll() is not None or time.time() > deadline:
+            process.kill()
+            raise RuntimeError(f"gunicorn did not come up with {workers} workers")
+        time.sleep(0.2)
+
+
+def run_job(base_url, i, args, run_id):
+    """Submit, wait for and download one video; returns a result dict."""
+    try:
+        return drive_job(base_url, i, args, run_id)
+    except requests.RequestException as e:
+        logging.getLogger("benchmark").warning("job %d: %s", i, e)
+        return {"status": "error", "submit": None, "total": None, "download": None, "bytes": 0}
+
+
+def drive_job(base_url, i, args, run_id):
+    session = requests.Session()
+    # gunicorn drops idle keep-alive connections after 2s; a poll that
+    # reuses one gets a disconnect and should simply reconnect.
+    session.mount("http://", HTTPAdapter(max_retries=Retry(total=2, allowed_methods={"GET"})))
+    headers = {
+        "Origin": args.origin,
+        # One client IP per job so the daily quota never gets in the way.
+        "X-Forwarded-For": f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}",
+    }
+    topic = f"benchmark {run_id} topic {i % args.distinct_topics if args.distinct_topics else i}"
+    result = {"status": "refused", "submit": None, "total": None, "download": None, "bytes": 0}
+
+    started = time.perf_counter()
+    resp = session.post(f"{base_url}/", data={"topic": topic}, headers=headers, timeout=60)
+    result["submit"] = time.perf_counter() - started
+    match = JOB_ID_RE.search(resp.text)
+    if resp.status_code != 200 or not match:
+        return result
+    job_id = match.group(1)
+
+    deadline = started + args.timeout
+    while True:
+        job = session.get(f"{base_url}/status/{job_id}", headers=headers, timeout=30).json()
+        if job.get("status") in ("completed", "failed", "not_found") or time.perf_counter() > deadline:
+            break
+        time.sleep(args.poll_interval)
+    result["total"] = time.perf_counter() - started
+    result["status"] = job.get("status", "timeout") if time.perf_counter() <= deadline else "timeout"
+    if result["status"] != "completed" or args.no_download:
+        return result
+
+    download_started = time.perf_counter()
+    with session.get(f"{base_url}/video/{job_id}", stream=True, timeout=60) as video:
+        for chunk in video.iter_content(256 * 1024):
+            result["bytes"] += len(chunk)
+    result["download"] = time.perf_counter() - download_started
+    result["total"] = time.perf_counter() - started
+    return result
+
+
+def report(results, wall, sampler, fake):
+    statuses = {}
+    for result in results:
+        statuses[result["status"]] = statuses.get(result["status"], 0) + 1
+    completed = [r for r in results if r["status"] == "completed"]
+    downloaded = sum(r["bytes"] for r in results)
+
+    print(f"jobs: {len(results)}  " + "  ".join(f"{k}: {v}" for k, v in sorted(statuses.items())))
+    print(f"wall time: {wall:.1f}s  throughput: {len(completed) / wall:.2f} completed jobs/s")
+    for name in ("submit", "total", "download"):
+        values = [r[name] for r in results if r[name] is not None]
+        if values:
+            print(
+                f"{name:>8} latency  p50 {percentile(values, 0.50):.3f}s  "
+                f"p95 {percentile(values, 0.95):.3f}s  p99 {percentile(values, 0.99):.3f}s  "
+                f"max {max(values):.3f}s"
+            )
+    if downloaded:
+        print(f"video: {downloaded / 1048576:.1f} MB downloaded, {downloaded / 1048576 / wall:.1f} MB/s")
+    if sampler.peak_threads is not None:
+        label = "app process" if len(sampler.pids) == 1 else f"app workers ({len(sampler.pids)}, summed)"
+        print(f"{label}: peak {sampler.peak_threads} threads, peak RSS {sampler.peak_rss_mb:.1f} MB")
+        print_timeline(sampler.samples)
+    if fake is not None:
+        print(f"fake upstream: {fake.requests} API requests")
+
+
+def in_process_foreign_threads():
+    """Threads of this process that belong to the driver or the fake."""
+    prefixes = ("driver", "fake-upstream", "sampler")
+    return sum(1 for thread in threading.enumerate() if thread.name.startswith(prefixes))
+
+
+def print_timeline(samples, rows=10):
+    """Threads and RSS at evenly spaced points of the run."""
+    step = max(-(-len(samples) // rows), 1)
+    picked = samples[::step]
+    if samples and picked[-1] is not samples[-1]:
+        picked.append(samples[-1])
+    print("  time    threads  RSS MB")
+    for seconds, threads, rss_mb in picked:
+        print(f"  {seconds:6.1f}s  {threads:7d}  {rss_mb:6.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--jobs", type=int, default=50, help="videos to request")
+    parser.add_argument("--concurrency", type=int, default=10, help="simulated users at once")
+    parser.add_argument("--distinct-topics", type=int, default=0,
+                        help="cycle through this many topics to exercise the caches (0: all distinct)")
+    parser.add_argument("--poll-interval", type=float, default=1.0)
+    parser.add_argument("--timeout", type=float, default=600, help="per-job give-up time in seconds")
+    parser.add_argument("--no-download", action="store_true", help="skip fetching /video")
+    parser.add_argument("--origin", default=DEFAULT_ORIGIN)
+    parser.add_argument("--latency", type=float, default=0.05, help="fake API latency in seconds")
+    parser.add_argument("--script-seconds", type=float, default=2.0, help="fake script generation time")
+    parser.add_argument("--render-seconds", type=float, default=10.0, help="fake render time")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="chance an init or render fails")
+    parser.add_argument("--video-mb", type=float, default=5.0, help="fake video size")
+    parser.add_argument("--url", help="benchmark an already running app instead of an in-process one")
+    parser.add_argument("--pid", type=int, help="app process to sample with --url")
+    parser.add_argument("--workers", type=int,
+                        help="run the app under gunicorn with this many workers (shared SQLite state)")
+    parser.add_argument("--mode", choices=("threaded", "async"),
+                        help="PIPELINE_MODE for the app this benchmark starts")
+    parser.add_argument("--fake-only", action="store_true", help="only serve the fake upstream")
+    parser.add_argument("--fake-port", type=int, default=0)
+    args = parser.parse_args()
+    if args.url and (args.workers or args.mode):
+        parser.error("--workers and --mode configure an app this benchmark starts; drop --url")
+
+    fake = FakeUpstream(
+        latency=args.latency,
+        script_seconds=args.script_seconds,
+        render_seconds=args.render_seconds,
+        failure_rate=args.failure_rate,
+        video_bytes=int(args.video_mb * 1024 * 1024),
+    )
+    if args.fake_only:
+        print(f"fake upstream at {fake.start(args.fake_port)}", flush=True)
+        threading.Event().wait()
+
+    pids = [args.pid] if args.pid else []
+    base_url = args.url
+    gunicorn = None
+    foreign = None
+    if base_url is None:
+        # Configure the app only now, pointed at the fake.
+        os.environ["NOTEGPT_BASE"] = fake.start(args.fake_port)
+        scratch = tempfile.mkdtemp(prefix="snapstudy-bench-")
+        os.environ.setdefault("VIDEO_CACHE_DIR", os.path.join(scratch, "video-cache"))
+        os.environ.setdefault("LOG_ARCHIVE_DIR", os.path.join(scratch, "log-archive"))
+        os.environ.setdefault("JOB_QUEUE_SIZE", str(max(args.jobs, 100)))
+        if args.mode:
+            os.environ["PIPELINE_MODE"] = args.mode
+    if args.workers:
+        env = {"STATE_BACKEND": "sqlite", "STATE_DB_PATH": os.path.join(scratch, "snapstudy.sqlite3")}
+        gunicorn, base_url, pids = start_gunicorn(args.workers, env)
+        print(f"gunicorn: {args.workers} workers at {base_url}", flush=True)
+    elif base_url is None:
+        from werkzeug.serving import make_server
+        import app as snapstudy
+
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+        server = make_server("127.0.0.1", 0, snapstudy.app, threaded=True)
+        thread = threading.Thread(target=server.serve_forever, name="app-server")
+        thread.daemon = True
+        thread.start()
+        base_url = f"http://127.0.0.1:{server.server_port}"
+        pids = [os.getpid()]
+        foreign = in_process_foreign_threads
+    else:
+        fake = None
+
+    run_id = uuid.uuid4().hex[:8]
+    started = time.perf_counter()
+    try:
+        with Sampler(pids, foreign=foreign) as sampler:
+            with ThreadPoolExecutor(args.concurrency, thread_name_prefix="driver") as pool:
+                results = list(pool.map(lambda i: run_job(base_url, i, args, run_id), range(args.jobs)))
+    finally:
+        if gunicorn is not None:
+            gunicorn.terminate()
+            gunicorn.wait()
+    report(results, time.perf_counter() - started, sampler, fake)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Self-host the UI fonts.
+
+Downloads the Google Fonts families used by the studio and admin pages,
+subsets them to Latin, and writes ``static/fonts/*.woff2`` plus a matching
+``static/fonts.css``. The app serves ``fonts.css`` in place of the Google
+Fonts stylesheet whenever it exists.
+
+Run at image build time (see Dockerfile). Needs network access and
+``fonttools`` with brotli for WOFF2 output.
+"""
+import io
+import os
+import re
+
+import requests
+from fontTools import subset
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+FONTS_DIR = os.path.join(STATIC_DIR, "fonts")
+
+FAMILIES = {
+    "Crimson Pro": (400, 600, 700),
+    "IBM Plex Mono": (400, 500, 600),
+    "Manrope": (400, 500, 600, 700, 800),
+}
+
+# Basic Latin, Latin-1 and the punctuation the templates use (dashes, arrows, quotes).
+LATIN_UNICODES = "U+0000-00FF,U+0131,U+0152-0153,U+02C6,U+02DA,U+02DC,U+2000-206F,U+20AC,U+2122,U+2190-2193"
+
+# Google only serves WOFF2 to browsers it recognises.
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+FACE_RE = re.compile(r"/\* latin \*/\s*@font-face\s*{(.*?)}", re.S)
+
+
+def google_css_url():
+    families = "&".join(
+        "family=" + name.replace(" ", "+") + ":wght@" + ";".join(str(w) for w in weights)
+        for name, weights in FAMILIES.items()
+    )
+    return f"https://fonts.googleapis.com/css2?{families}&display=swap"
+
+
+def parse_faces(css):
+    for block in FACE_RE.findall(css):
+        props = dict(
+            (key.strip(), value.strip())
+            for key, value in (line.split(":", 1) for line in block.split(";") if ":" in line)
+        )
+        yield {
+            "family": props["font-family"].strip("'\""),
+            "style": props["font-style"],
+            "weight": props["font-weight"],
+            "url": re.search(r"url\((.*?)\)", props["src"]).group(1),
+        }
+
+
+def subset_woff2(data):
+    options = subset.Options()
+    options.flavor = "woff2"
+    options.layout_features = ["*"]
+    font = subset.load_font(io.BytesIO(data), options)
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(unicodes=subset.parse_unicodes(LATIN_UNICODES))
+    subsetter.subset(font)
+    out = io.BytesIO()
+    subset.save_font(font, out, options)
+    return out.getvalue()
+
+
+def main():
+    session = requests.Session()
+    session.headers["User-Agent"] = USER_AGENT
+    resp = session.get(google_css_url(), timeout=30)
+    resp.raise_for_status()
+
+    os.makedirs(FONTS_DIR, exist_ok=True)
+    # Variable fonts come back as one file for several weights.
+    files = {}
+    rules = []
+    for face in parse_faces(resp.text):
+        if face["url"] not in files:
+            slug = face["family"].lower().replace(" ", "-")
+            filename = f"{slug}-{face['style']}-{face['weight']}.woff2"
+            font = session.get(face["url"], timeout=30)
+            font.raise_for_status()
+            with open(os.path.join(FONTS_DIR, filename), "wb") as f:
+                f.write(subset_woff2(font.content))
+            files[face["url"]] = filename
+        rules.append(
+            "@font-face {\n"
+            f"  font-family: '{face['family']}';\n"
+            f"  font-style: {face['style']};\n"
+            f"  font-weight: {face['weight']};\n"
+            "  font-display: swap;\n"
+            f"  src: url(fonts/{files[face['url']]}) format('woff2');\n"
+            f"  unicode-range: {LATIN_UNICODES};\n"
+            "}\n"
+        )
+
+    with open(os.path.join(STATIC_DIR, "fonts.css"), "w") as f:
+        f.write("\n".join(rules))
+    print(f"Wrote {len(files)} font files and {len(rules)} @font-face rules")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,379 @@
+"""Micro-benchmarks for individual hot paths.
+
+Each subcommand times one component in isolation rather than the whole
+submit/poll/download flow (see benchmark.py for end-to-end load). Those
+that need a CDN (``stream``, ``cdn``) run a local stub in a separate
+process. The app is imported with its on-disk state pointed at a scratch
+directory, so nothing here touches a real deployment.
+
+    python microbench.py jobstore --jobs 1000000
+    python microbench.py ratelimit --ips 1000000
+    python microbench.py stream --video-mb 50
+    python microbench.py pages
+    python microbench.py front
+    python microbench.py cdn --requests 500
+"""
+import argparse
+import io
+import multiprocessing
+import os
+import random
+import socket
+import ssl
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+SCRATCH = tempfile.mkdtemp(prefix="snapstudy-microbench-")
+
+
+def load_app(**env):
+    """Import app.py configured for a scratch directory plus ``env``."""
+    os.environ.setdefault("VIDEO_CACHE_DIR", os.path.join(SCRATCH, "video-cache"))
+    os.environ.setdefault("LOG_ARCHIVE_DIR", os.path.join(SCRATCH, "log-archive"))
+    os.environ.setdefault("STATE_BACKEND", "memory")
+    os.environ.update(env)
+    import app
+    return app
+
+
+def timed(label, n, fn):
+    """Call ``fn(i)`` for ``i`` in ``range(n)`` and print the rate."""
+    started = time.perf_counter()
+    for i in range(n):
+        fn(i)
+    elapsed = time.perf_counter() - started
+    print(f"  {label:<24} {n / elapsed:>12,.0f} ops/s  {elapsed / n * 1e6:>8.2f} us/op")
+    return elapsed
+
+
+# =========================
+# Job stores
+# =========================
+def bench_jobstore(args):
+    app = load_app()
+    ids = [str(uuid.uuid4()) for _ in range(args.jobs)]
+    job = app.new_job("How tides work", "10.0.0.1")
+    stores = {
+        "memory": lambda: app.MemoryJobStore(max_jobs=args.jobs),
+        "sqlite": lambda: app.SQLiteJobStore(os.path.join(SCRATCH, f"jobs-{uuid.uuid4().hex}.sqlite3")),
+    }
+    for name in args.stores:
+        store = stores[name]()
+        sample = random.sample(ids, min(args.sample, len(ids)))
+        print(f"{name}: {args.jobs:,} jobs")
+        timed("insert", len(ids), lambda i: store.create(ids[i], job))
+        timed("lookup", len(sample), lambda i: store.get(sample[i]))
+        timed("update", len(sample), lambda i: store.update(sample[i], progress=f"Step {i}"))
+        timed("lookup (missing)", len(sample), lambda i: store.get(f"missing-{i}"))
+
+
+# =========================
+# Rate limiting
+# =========================
+def sqlite_hit_before(state, ip, gcra, limit, period):
+    """SQLiteState.hit_rate_limit as it was before the single-UPSERT
+    version: SELECT then INSERT OR REPLACE inside BEGIN IMMEDIATE."""
+    now = time.time()
+    with state._transaction() as conn:
+        row = conn.execute("SELECT tat FROM rate_limits WHERE ip = ?", (ip,)).fetchone()
+        tat = gcra(row[0] if row else None, now, limit, period)
+        if tat is not None:
+            conn.execute("INSERT OR REPLACE INTO rate_limits (ip, tat) VALUES (?, ?)", (ip, tat))
+        if random.random() < 0.01:
+            conn.execute("DELETE FROM rate_limits WHERE tat <= ?", (now,))
+        return tat is not None
+
+
+def bench_ratelimit(args):
+    app = load_app()
+    limit, period = app.RATE_LIMIT_PER_DAY, app.RATE_LIMIT_PERIOD
+    ips = [f"{10 + (i >> 24)}.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(args.ips)]
+    print(f"{args.ips:,} distinct IPs, {limit} per {period:.0f}s (target: under 10 us per call)")
+
+    limiter = app.RateLimiter(limit, period)
+    print("memory (RateLimiter)")
+    timed("first hit", len(ips), lambda i: limiter.hit(ips[i]))
+    timed("second hit", len(ips), lambda i: limiter.hit(ips[i]))
+    timed("exhausted check", len(ips), lambda i: limiter.exhausted(ips[i]))
+
+    variants = {
+        "sqlite (before)": lambda state, ip: sqlite_hit_before(state, ip, app.gcra, limit, period),
+        "sqlite (upsert)": lambda state, ip: state.hit_rate_limit(ip),
+    }
+    for name, hit in variants.items():
+        state = app.SQLiteState(os.path.join(SCRATCH, f"state-{uuid.uuid4().hex}.sqlite3"))
+        print(name)
+        timed("first hit", len(ips), lambda i: hit(state, ips[i]))
+        timed("second hit", len(ips), lambda i: hit(state, ips[i]))
+    # FrontFilter's per-request peek; hits are only spent on new pipelines.
+    timed("exhausted check", len(ips), lambda i: state.rate_limit_exhausted(ips[i]))
+
+
+# =========================
+# Video streaming
+# =========================
+def start_fake_cdn(video_mb):
+    """Serve benchmark.py's fake CDN from its own process, so its CPU time
+    isn't counted against the code being measured."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    process = subprocess.Popen(
+        [sys.executable, "benchmark.py", "--fake-only", "--fake-port", str(port), "--video-mb", str(video_mb)],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        stdout=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}/cdn/microbench.mp4"
+    deadline = time.time() + 30
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process, url
+        except OSError:
+            if time.time() > deadline:
+                process.kill()
+                raise
+            time.sleep(0.1)
+
+
+def bench_stream(args):
+    app = load_app()
+    process, url = start_fake_cdn(args.video_mb)
+
+    def before(req):
+        # stream_video's original loop: fixed 8 KiB chunks from iter_content.
+        for chunk in req.iter_content(chunk_size=8192):
+            yield chunk
+
+    def after(req):
+        return app.count_video_bytes(app.iter_upstream(req), "upstream")
+
+    print(f"{args.streams} streams of {args.video_mb:g} MB from a local CDN stub")
+    try:
+        for name, body in (("iter_content(8192)", before), ("iter_upstream", after)):
+            received = 0
+            started, cpu_started = time.perf_counter(), time.process_time()
+            for _ in range(args.streams):
+                with app.cdn_session.get(url, headers={"Accept-Encoding": "identity"}, stream=True) as req:
+                    for chunk in body(req):
+                        received += len(chunk)
+            elapsed, cpu = time.perf_counter() - started, time.process_time() - cpu_started
+            mb = received / 1048576
+            print(f"  {name:<24} {mb / elapsed:>8.0f} MB/s  {cpu / args.streams * 1000:>8.1f} ms CPU per stream"
+                  f"  {cpu / mb * 1000:>6.2f} ms CPU per MB")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+# =========================
+# Page rendering
+# =========================
+def requests_per_second(client, path, seconds, **kwargs):
+    """Issue ``path`` through the WSGI test client for ``seconds``;
+    returns ``(requests/s, response bytes)``."""
+    done = 0
+    size = 0
+    deadline = time.perf_counter() + seconds
+    started = time.perf_counter()
+    while time.perf_counter() < deadline:
+        size = len(client.get(path, **kwargs).data)
+        done += 1
+    return done / (time.perf_counter() - started), size
+
+
+def bench_pages(args):
+    app = load_app()
+    from flask import render_template_string
+
+    def compile_per_request(template, **context):
+        # index() before precompiling: render_template_string on every hit,
+        # which parses and compiles the template source each time.
+        if template is app.INDEX_PAGE:
+            return render_template_string(app.TEMPLATE, **context)
+        return render_template(template, **context)
+
+    render_template = app.render_template
+    client = app.app.test_client()
+    print(f"GET / through the WSGI test client, {args.seconds:g}s per variant (no network)")
+    rates = {}
+    for name, render in (("render_template_string", compile_per_request), ("precompiled", render_template)):
+        app.render_template = render
+        try:
+            rates[name], size = requests_per_second(client, "/", args.seconds)
+        finally:
+            app.render_template = render_template
+        print(f"  {name:<24} {rates[name]:>8.0f} req/s  {size:,} bytes")
+    print(f"  speedup: {rates['precompiled'] / rates['render_template_string']:.1f}x")
+
+
+# =========================
+# Front filter
+# =========================
+def bench_front(args):
+    app = load_app()
+    from werkzeug.test import EnvironBuilder
+
+    limited_ip = "10.20.0.1"
+    while app.state.hit_rate_limit(limited_ip):
+        pass
+    cases = {
+        "foreign origin": EnvironBuilder(
+            path="/", method="POST", data={"topic": "How tides work"},
+            headers={"Origin": "https://elsewhere.example"}, environ_base={"REMOTE_ADDR": "10.20.0.2"},
+        ),
+        "out of quota": EnvironBuilder(
+            path="/", method="POST", data={"topic": "How tides work"},
+            headers={"Origin": app.ALLOWED_ORIGINS[0]},
+            environ_base={"REMOTE_ADDR": limited_ip},
+        ),
+    }
+
+    def start_response(status, headers):
+        pass
+
+    print(f"rejected POST / called straight on the WSGI app, {args.requests:,} per variant")
+    for case, builder in cases.items():
+        environ = builder.get_environ()
+        body = environ["wsgi.input"].read()
+        print(case)
+        for name, wsgi_app in (("Flask route", app.app.wsgi_app.wsgi_app), ("FrontFilter", app.app.wsgi_app)):
+            def call(i):
+                env = dict(environ, **{"wsgi.input": io.BytesIO(body)})
+                result = wsgi_app(env, start_response)
+                b"".join(result)
+                if hasattr(result, "close"):
+                    result.close()
+            timed(name, args.requests, call)
+
+
+# =========================
+# CDN connection pool
+# =========================
+class TinyVideo(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out as two writes; without this, Nagle plus
+    # delayed ACKs add ~40 ms to every keep-alive response.
+    disable_nagle_algorithm = True
+    body = bytes(16 * 1024)
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+
+def serve_https(port, cert):
+    server = ThreadingHTTPServer(("127.0.0.1", port), TinyVideo)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    server.serve_forever()
+
+
+def start_https_cdn():
+    """A local HTTPS stub with a throwaway self-signed cert (needs the
+    openssl CLI), in its own process. Returns ``(process, url, cert)``."""
+    cert = os.path.join(SCRATCH, "cdn.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=127.0.0.1",
+         "-addext", "subjectAltName=IP:127.0.0.1", "-keyout", cert, "-out", cert],
+        check=True, capture_output=True,
+    )
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    process = multiprocessing.Process(target=serve_https, args=(port, cert), daemon=True)
+    process.start()
+    deadline = time.time() + 30
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process, f"https://127.0.0.1:{port}/cdn/microbench.mp4", cert
+        except OSError:
+            if time.time() > deadline:
+                process.kill()
+                raise
+            time.sleep(0.1)
+
+
+def bench_cdn(args):
+    app = load_app()
+    process, url, cert = start_https_cdn()
+    variants = {
+        # stream_video before the pooled session: a bare requests.get, so a
+        # new TCP connection and TLS handshake every time.
+        "requests.get": lambda: requests.get(url, verify=cert, timeout=30),
+        "cdn_session": lambda: app.cdn_session.get(url, verify=cert, timeout=30),
+    }
+    print(f"{args.requests} sequential GETs of a 16 KiB body over HTTPS")
+    try:
+        means = {}
+        for name, get in variants.items():
+            latencies = []
+            for _ in range(args.requests):
+                started = time.perf_counter()
+                get().content
+                latencies.append(time.perf_counter() - started)
+            latencies.sort()
+            means[name] = sum(latencies) / len(latencies)
+            print(f"  {name:<24} mean {means[name] * 1000:6.2f} ms"
+                  f"  p50 {latencies[len(latencies) // 2] * 1000:6.2f} ms"
+                  f"  p99 {latencies[int(len(latencies) * 0.99)] * 1000:6.2f} ms")
+        print(f"  saved per request: {(means['requests.get'] - means['cdn_session']) * 1000:.2f} ms")
+        pool = app.cdn_pool_stats()
+        print(f"  pool: {pool['requests']} requests over {pool['connections']} connections"
+              f" ({pool['reused']} handshakes avoided)")
+    finally:
+        process.terminate()
+        process.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    jobstore = commands.add_parser("jobstore", help="insert/update/lookup throughput of the job stores")
+    jobstore.add_argument("--jobs", type=int, default=1_000_000, help="jobs to insert before timing lookups")
+    jobstore.add_argument("--sample", type=int, default=100_000, help="random jobs to look up and update")
+    jobstore.add_argument("--stores", nargs="+", choices=("memory", "sqlite"), default=("memory", "sqlite"))
+    jobstore.set_defaults(run=bench_jobstore)
+
+    ratelimit = commands.add_parser("ratelimit", help="per-call cost of the rate limiters")
+    ratelimit.add_argument("--ips", type=int, default=1_000_000, help="distinct client IPs")
+    ratelimit.set_defaults(run=bench_ratelimit)
+
+    stream = commands.add_parser("stream", help="MB/s and CPU of the video proxy's read loop")
+    stream.add_argument("--video-mb", type=float, default=50, help="size of each streamed video")
+    stream.add_argument("--streams", type=int, default=20, help="videos to stream per variant")
+    stream.set_defaults(run=bench_stream)
+
+    pages = commands.add_parser("pages", help="GET / requests/sec with and without precompiled templates")
+    pages.add_argument("--seconds", type=float, default=5)
+    pages.set_defaults(run=bench_pages)
+
+    front = commands.add_parser("front", help="cost of a rejected POST / with and without FrontFilter")
+    front.add_argument("--requests", type=int, default=20_000, help="requests per variant")
+    front.set_defaults(run=bench_front)
+
+    cdn = commands.add_parser("cdn", help="latency saved by the pooled CDN session over HTTPS")
+    cdn.add_argument("--requests", type=int, default=500, help="GETs per variant")
+    cdn.set_defaults(run=bench_cdn)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
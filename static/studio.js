@@ -0,0 +1,83 @@
+const jobId = document.body.dataset.jobId;
+
+function render(data) {
+  const progressText = document.getElementById('progressText');
+  const canvas = document.getElementById('canvas');
+
+  if (progressText) {
+    progressText.textContent = data.progress || 'Processing...';
+  }
+
+  if (data.status === 'completed') {
+    canvas.innerHTML = `
+      <div class="video-complete">
+        <video controls playsinline>
+          <source src="${data.video_url}" type="video/mp4">
+        </video>
+        <h3>Synthesis Complete</h3>
+        <p>Your video is ready for download and distribution.</p>
+        <div class="video-actions">
+          <a href="${data.video_url}" download="snapstudy-ai-video.mp4" class="btn-download">
+            Download Video
+          </a>
+        </div>
+        <div class="credit">
+          Attribution applied: "By Chirag Rathi"
+        </div>
+      </div>
+    `;
+  } else if (data.status === 'failed') {
+    canvas.innerHTML = `
+      <div class="error-state">
+        <div class="error-icon">
+          <svg fill="none" viewBox="0 0 24 24">
+            <path stroke-linecap="round" stroke-linejoin="round" d="M12 9v3.75m9-.75a9 9 0 11-18 0 9 9 0 0118 0zm-9 3.75h.008v.008H12v-.008z"/>
+          </svg>
+        </div>
+        <h3>Synthesis Failed</h3>
+        <p>An error occurred during processing. Please try again with different input.</p>
+        <details class="error-details">
+          <summary style="cursor: pointer; font-weight: 600; margin-bottom: 0.5rem;">Technical Details</summary>
+          <pre style="white-space: pre-wrap; word-wrap: break-word;">${data.error}</pre>
+        </details>
+      </div>
+    `;
+  }
+  return data.status === 'completed' || data.status === 'failed';
+}
+
+function checkStatus() {
+  fetch('/status/' + jobId)
+    .then(res => res.json())
+    .then(data => {
+      if (!render(data)) {
+        setTimeout(checkStatus, 3000);
+      }
+    })
+    .catch(err => {
+      console.error('Status check failed:', err);
+      setTimeout(checkStatus, 5000);
+    });
+}
+
+function listen() {
+  const events = new EventSource('/events/' + jobId);
+  events.onmessage = (e) => {
+    if (render(JSON.parse(e.data))) {
+      events.close();
+    }
+  };
+  events.addEventListener('end', () => events.close());
+  events.onerror = () => {
+    // Fall back to polling if the stream can't be (re)established.
+    if (events.readyState === EventSource.CLOSED) {
+      checkStatus();
+    }
+  };
+}
+
+if (window.EventSource) {
+  listen();
+} else {
+  checkStatus();
+}
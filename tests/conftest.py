@@ -0,0 +1,48 @@
+import os
+import sys
+import tempfile
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# app.py reads its config at import; keep its on-disk state out of the repo.
+_scratch = tempfile.mkdtemp(prefix="snapstudy-tests-")
+os.environ.setdefault("VIDEO_CACHE_DIR", os.path.join(_scratch, "video-cache"))
+os.environ.setdefault("LOG_ARCHIVE_DIR", os.path.join(_scratch, "log-archive"))
+os.environ.setdefault("STATE_BACKEND", "memory")
+
+import app as snapstudy_app  # noqa: E402
+from benchmark import FakeUpstream  # noqa: E402
+
+
+@pytest.fixture
+def snapstudy():
+    return snapstudy_app
+
+
+@pytest.fixture
+def fake_upstream(snapstudy, monkeypatch):
+    """A local NoteGPT stand-in fast enough for a job to finish in seconds."""
+    fake = FakeUpstream(latency=0, script_seconds=0.2, render_seconds=0.5, video_bytes=1024)
+    monkeypatch.setattr(snapstudy, "NOTEGPT_BASE", fake.start())
+    yield fake
+    fake.stop()
+
+
+@pytest.fixture
+def wait_finished(snapstudy):
+    """Block until every job id reaches a terminal status; returns the jobs."""
+
+    def wait(job_ids, timeout=30):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            found = [snapstudy.jobs.get(job_id) for job_id in job_ids]
+            if all(job and job["status"] in snapstudy.TERMINAL_STATUSES for job in found):
+                return found
+            time.sleep(0.1)
+        raise AssertionError(f"jobs still running after {timeout}s: {found}")
+
+    return wait
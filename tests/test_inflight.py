@@ -0,0 +1,29 @@
+import re
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+ORIGIN = {"Referer": "https://snapstudy-ai.onrender.com/"}
+JOB_ID_RE = re.compile(r'data-job-id="([^"]+)"')
+
+
+def test_identical_submissions_run_one_pipeline(snapstudy, fake_upstream, wait_finished):
+    topic = f"How tides work {uuid.uuid4().hex[:8]}"
+    started = sum(snapstudy.jobs_started.totals().values())
+
+    def submit(i):
+        client = snapstudy.app.test_client(use_cookies=False)
+        resp = client.post("/", data={"topic": topic}, headers=ORIGIN,
+                           environ_base={"REMOTE_ADDR": f"10.11.0.{i}"})
+        assert resp.status_code == 200
+        return JOB_ID_RE.search(resp.get_data(as_text=True)).group(1)
+
+    with ThreadPoolExecutor(8) as pool:
+        job_ids = list(pool.map(submit, range(8)))
+
+    finished = wait_finished(job_ids)
+    assert len(set(job_ids)) == 8
+    assert [job["status"] for job in finished] == ["completed"] * 8
+    assert [job["video_url"] for job in finished] == [f"/video/{job_id}" for job_id in job_ids]
+    assert len(fake_upstream.conversations) == 1
+    assert sum(snapstudy.jobs_started.totals().values()) - started == 1
@@ -0,0 +1,10 @@
+def test_sqlite_limiter_matches_gcra(snapstudy, tmp_path):
+    state = snapstudy.SQLiteState(str(tmp_path / "state.sqlite3"))
+    limiter = snapstudy.RateLimiter(snapstudy.RATE_LIMIT_PER_DAY, snapstudy.RATE_LIMIT_PERIOD)
+
+    for _ in range(snapstudy.RATE_LIMIT_PER_DAY + 2):
+        assert state.rate_limit_exhausted("10.14.0.1") == limiter.exhausted("10.14.0.1")
+        assert state.hit_rate_limit("10.14.0.1") == limiter.hit("10.14.0.1")
+    assert state.rate_limit_exhausted("10.14.0.1")
+    assert not state.rate_limit_exhausted("10.14.0.2")
+    assert state.ip_count() == 1
@@ -0,0 +1,77 @@
+import time
+
+import pytest
+
+DEAD_LEASE = {"owner": "worker-that-died", "until": 0}
+
+
+@pytest.fixture
+def sqlite_jobs(snapstudy, tmp_path, monkeypatch):
+    store = snapstudy.SQLiteJobStore(str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setattr(snapstudy, "jobs", store)
+    monkeypatch.setattr(snapstudy.leases, "enabled", True)
+    monkeypatch.setattr(snapstudy.leases, "owner", "test-worker")
+    return store
+
+
+def orphan(snapstudy, store, topic, checkpoint=None):
+    """A leader and two followers left behind by a worker that died."""
+    leader = dict(snapstudy.new_job(topic, "10.12.0.1"), status="processing",
+                  started_at=time.time(), lease=DEAD_LEASE, checkpoint=checkpoint)
+    store.create("L", leader)
+    for i, follower_id in enumerate(("F1", "F2")):
+        store.create(follower_id, dict(snapstudy.new_job(topic), status="processing",
+                                       leader_id="L", user_ip=f"10.12.0.{i + 2}"))
+    return ["L", "F1", "F2"]
+
+
+@pytest.mark.parametrize("mode", ["threaded", "async"])
+@pytest.mark.parametrize("checkpointed", [False, True], ids=["fresh", "checkpointed"])
+def test_recovery_resumes_leader_once_and_reattaches_followers(snapstudy, fake_upstream, sqlite_jobs,
+                                                              wait_finished, monkeypatch, mode, checkpointed):
+    monkeypatch.setattr(snapstudy, "PIPELINE_MODE", mode)
+    topic = f"Orphaned topic {mode} {checkpointed}"
+    checkpoint = None
+    if checkpointed:
+        cid = fake_upstream.init()["data"]["conversation_id"]
+        fake_upstream.render(cid)
+        checkpoint = {"stage": "poll_final_video", "cid": cid, "headers": {}, "cookies": {}}
+    job_ids = orphan(snapstudy, sqlite_jobs, topic, checkpoint)
+    assert sqlite_jobs.lapsed(time.time()) == ["L"]
+
+    snapstudy.leases._recover()
+
+    finished = wait_finished(job_ids)
+    assert [job["status"] for job in finished] == ["completed"] * 3
+    assert [job["video_url"] for job in finished] == [f"/video/{job_id}" for job_id in job_ids]
+    assert len(fake_upstream.conversations) == 1
+    assert sqlite_jobs.lapsed(time.time()) == []
+
+
+@pytest.mark.parametrize("mode", ["threaded", "async"])
+def test_pipeline_stops_once_its_lease_is_claimed_elsewhere(snapstudy, fake_upstream, sqlite_jobs, monkeypatch,
+                                                            mode):
+    monkeypatch.setattr(snapstudy, "PIPELINE_MODE", mode)
+    fake_upstream.render_seconds = 60
+    topic = f"Lease stolen mid render {mode}"
+    job_id, refusal = snapstudy.submit_job(topic, "10.12.1.1")
+    assert refusal is None
+    deadline = time.time() + 20
+    while (sqlite_jobs.get(job_id).get("checkpoint") or {}).get("stage") != "poll_final_video":
+        assert time.time() < deadline
+        time.sleep(0.1)
+
+    other = {"owner": "other-worker", "until": time.time() + 60}
+    sqlite_jobs.update(job_id, lease=other)
+    handed_over = snapstudy.jobs_finished.totals().get("handed_over", 0)
+    snapstudy.leases._heartbeat()
+    assert not snapstudy.leases.holds(job_id)
+
+    deadline = time.time() + 20
+    while snapstudy.jobs_finished.totals().get("handed_over", 0) == handed_over:
+        assert time.time() < deadline
+        time.sleep(0.1)
+    job = sqlite_jobs.get(job_id)
+    assert job["status"] == "processing"
+    assert job["lease"] == other
+    assert not snapstudy.inflight.running(snapstudy.topic_cache_key(topic))
@@ -0,0 +1,35 @@
+import threading
+import time
+
+
+def app_threads():
+    # The fake upstream spawns a thread per request; only count the app's own.
+    return sum(1 for t in threading.enumerate() if not t.name.startswith("fake-upstream"))
+
+
+def test_thread_count_stays_bounded_under_load(snapstudy, fake_upstream, wait_finished):
+    baseline = app_threads()
+    peak = [baseline]
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(0.02):
+            peak[0] = max(peak[0], app_threads())
+
+    sampler = threading.Thread(target=sample, name="thread-sampler")
+    sampler.start()
+    try:
+        job_ids = []
+        for i in range(48):
+            job_id, refusal = snapstudy.submit_job(f"Bounded load topic {i} {time.time()}", f"10.13.0.{i}")
+            assert refusal is None
+            job_ids.append(job_id)
+        finished = wait_finished(job_ids)
+    finally:
+        done.set()
+        sampler.join()
+
+    assert [job["status"] for job in finished] == ["completed"] * len(job_ids)
+    # 48 jobs, but only the job workers, poll workers and poll timer (plus
+    # the sampler itself) are ever added.
+    assert peak[0] <= baseline + 1 + snapstudy.JOB_WORKERS + snapstudy.POLL_WORKERS + 1
@@ -0,0 +1,80 @@
+import threading
+import time
+
+
+class StubResolver:
+    """Hands out queued answers (an Exception is raised instead); each call
+    blocks until ``gate`` is set."""
+
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.calls = 0
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def __call__(self):
+        self.gate.wait(5)
+        self.calls += 1
+        answer = self.answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+
+def settle(identity):
+    deadline = time.time() + 5
+    while identity._refreshing and time.time() < deadline:
+        time.sleep(0.01)
+    assert not identity._refreshing
+
+
+def local_ip():
+    return "10.0.0.5"
+
+
+def test_fresh_lookup_does_not_block(snapstudy):
+    resolver = StubResolver("203.0.113.7")
+    resolver.gate.clear()
+    identity = snapstudy.ServerIdentity(resolver=resolver, fallback=local_ip, ttl=60, retry=60)
+
+    assert identity.current() == "10.0.0.5 (local)"
+    resolver.gate.set()
+    settle(identity)
+    assert identity.current() == "203.0.113.7"
+    assert identity.current() == "203.0.113.7"
+    assert resolver.calls == 1
+
+
+def test_stale_value_is_served_while_refreshing(snapstudy):
+    resolver = StubResolver("203.0.113.7", "203.0.113.8")
+    identity = snapstudy.ServerIdentity(resolver=resolver, fallback=local_ip, ttl=0.2, retry=60)
+    identity.current()
+    settle(identity)
+
+    time.sleep(0.25)
+    resolver.gate.clear()
+    assert identity.current() == "203.0.113.7"
+    resolver.gate.set()
+    settle(identity)
+    assert identity.current() == "203.0.113.8"
+    assert resolver.calls == 2
+
+
+def test_failed_refresh_keeps_last_good_value(snapstudy):
+    resolver = StubResolver(OSError("no route"), "203.0.113.7", OSError("no route"))
+    identity = snapstudy.ServerIdentity(resolver=resolver, fallback=local_ip, ttl=0.2, retry=0.2)
+
+    identity.current()
+    settle(identity)
+    assert identity.current() == "10.0.0.5 (local)"
+
+    time.sleep(0.25)
+    identity.current()
+    settle(identity)
+    assert identity.current() == "203.0.113.7"
+
+    time.sleep(0.25)
+    identity.current()
+    settle(identity)
+    assert identity.current() == "203.0.113.7"
+    assert resolver.calls == 3
@@ -0,0 +1,87 @@
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+from werkzeug.serving import make_server
+
+
+class ForbiddenCDN(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.send_response(403)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+@pytest.fixture
+def forbidden_cdn():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ForbiddenCDN)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/cdn/video.mp4"
+    server.shutdown()
+    server.server_close()
+
+
+def completed_job(snapstudy, original_url):
+    job_id = str(uuid.uuid4())
+    snapstudy.jobs.create(job_id, dict(snapstudy.new_job("Video proxy"), status="completed",
+                                       original_url=original_url, video_url=f"/video/{job_id}"))
+    return job_id
+
+
+def test_failed_proxy_fetch_returns_its_connection(snapstudy, forbidden_cdn):
+    job_id = completed_job(snapstudy, forbidden_cdn)
+    client = snapstudy.app.test_client()
+    for _ in range(snapstudy.CDN_POOL_PER_HOST + 2):
+        resp = client.get(f"/video/{job_id}", headers={"Range": "bytes=0-99"})
+        assert resp.status_code == 500
+
+    pool = snapstudy.cdn_adapter.poolmanager.connection_from_url(forbidden_cdn)
+    assert pool.num_requests == snapstudy.CDN_POOL_PER_HOST + 2
+    assert pool.num_connections == 1
+
+
+def test_open_ended_ranges_share_one_cdn_download(snapstudy, fake_upstream):
+    fake_upstream.video_bytes = 4 * 1024 * 1024
+    cdn_url = snapstudy.NOTEGPT_BASE.split("/api/")[0] + "/cdn/shared.mp4"
+    job_id = completed_job(snapstudy, cdn_url)
+    server = make_server("127.0.0.1", 0, snapstudy.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def fetch(start):
+        resp = requests.get(f"http://127.0.0.1:{server.server_port}/video/{job_id}",
+                            headers={"Range": f"bytes={start}-"}, timeout=30)
+        return resp.status_code, resp.headers.get("Content-Range"), len(resp.content)
+
+    try:
+        with ThreadPoolExecutor(10) as pool:
+            results = list(pool.map(fetch, [0] * 10))
+    finally:
+        server.shutdown()
+
+    size = fake_upstream.video_bytes
+    assert results == [(206, f"bytes 0-{size - 1}/{size}", size)] * 10
+    assert snapstudy.cdn_adapter.poolmanager.connection_from_url(cdn_url).num_requests == 1
+
+
+def test_cache_cap_holds_across_workers_sharing_a_directory(snapstudy, tmp_path):
+    workers = [snapstudy.VideoCache(str(tmp_path), max_bytes=3000) for _ in range(2)]
+
+    def commit(cache, name):
+        part = tmp_path / f"{name}.part"
+        part.write_bytes(bytes(1000))
+        return cache._commit(name, str(part))
+
+    for i in range(6):
+        assert commit(workers[i % 2], f"video{i}")
+
+    on_disk = sorted(p.name for p in tmp_path.glob("*.mp4"))
+    assert on_disk == ["video3.mp4", "video4.mp4", "video5.mp4"]